@@ -1,26 +1,97 @@
-import os
+import gc
+import sqlite3
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from datetime import datetime
+from sqlalchemy import event
+from app.config import Config, basedir
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = b'WR#&f&+%78er0we=%799eww+#7^90-;s'
-login = LoginManager(app)
-login.login_view = 'login'
+db = SQLAlchemy()
+login = LoginManager()
+login.login_view = 'auth.login'
+# The JSON API answers 401 rather than redirecting to the login page
+login.blueprint_login_views['api'] = None
 
-basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'data', 'data.sqlite')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'data', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = 1 * 1024 * 1024
-# app.config['MAX_CONTENT_LENGTH'] = 8
+# Imported on first use rather than at start-up; preload() imports them up front instead
+LAZY_MODULES = ['app.forms', 'app.importer', 'app.jobs', 'app.export', 'app.assessments', 'email_validator']
 
-from app import views
-from app.models import *
 
+def sqlitePragmas(busy_timeout_ms, mmap_size):
+    # WAL lets readers carry on while a write transaction (such as a background import) is open, and
+    # synchronous=NORMAL is safe under WAL while skipping an fsync on every commit. Writers that do
+    # collide wait for the busy timeout instead of failing straight away.
+    def setSqlitePragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
+            cursor.execute(f'PRAGMA mmap_size={mmap_size}')
+            cursor.close()
+    return setSqlitePragmas
 
-@app.shell_context_processor
-def make_shell_context():
-    return dict(db=db, User=User, Employee=Employee, datetime=datetime, LoginManager=LoginManager)
+
+def create_app(config=None):
+    # config is a dict or an object with upper-case attributes, applied over Config
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+            'pool_size': app.config['DB_POOL_SIZE'],
+            'max_overflow': app.config['DB_MAX_OVERFLOW'],
+            'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+            'pool_recycle': app.config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+        })
+
+    if app.config['TRUSTED_PROXY_HOPS']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['TRUSTED_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    db.init_app(app)
+    login.init_app(app)
+    pragmas = sqlitePragmas(app.config['SQLITE_BUSY_TIMEOUT_MS'], app.config['SQLITE_MMAP_SIZE'])
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', pragmas)
+
+    from app import models, cache, commands, metrics, ratelimit, audit
+    from app.views import auth, employee, admin, api
+    with app.app_context():
+        # Tables added since the database was made are created, empty, so a checkout runs without a manual
+        # step; "flask migrate" still builds missing indexes on existing tables and backfills data
+        db.create_all(bind_key=None)
+    models.initUserCache(app)
+    cache.initCache(app)
+    ratelimit.initRateLimits(app)
+    audit.initAudit(app)
+    app.register_blueprint(metrics.bp)
+    app.register_blueprint(commands.bp)
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(employee.bp)
+    app.register_blueprint(admin.bp)
+    app.register_blueprint(api.bp)
+
+    @app.shell_context_processor
+    def make_shell_context():
+        return dict(db=db, User=models.User, Employee=models.Employee, Job=models.Job,
+                    datetime=models.datetime, LoginManager=LoginManager)
+
+    return app
+
+
+def preload():
+    # For a forking server master: imports everything workers would otherwise import on first use, then
+    # moves the objects made so far out of the garbage collector's reach, so the collector never writes
+    # to (and un-shares) the memory pages workers inherit copy-on-write
+    from importlib import import_module
+    for name in LAZY_MODULES:
+        import_module(name)
+    gc.collect()
+    gc.freeze()
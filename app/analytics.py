@@ -0,0 +1,161 @@
+from collections import namedtuple
+from threading import Lock
+from time import monotonic
+from flask import current_app
+from sqlalchemy import DDL, event, text
+from app import db
+from app.models import Employee, EmployeeSummary, BADGE_TIERS, DEFAULT_BADGE
+
+# Skill point percentiles shown on the dashboard
+PERCENTILES = (25, 50, 75, 90, 99)
+
+Analytics = namedtuple('Analytics', ['headcount', 'average_experience', 'roles', 'badges', 'percentiles',
+                                     'max_points'])
+RoleStats = namedtuple('RoleStats', ['role', 'headcount', 'average_experience'])
+
+
+def _keys(row):
+    # The employee_summary rows an employees row (new or old) is counted in
+    return (f"(dimension = 'role' AND value = {row}.current_role) "
+            f"OR (dimension = 'badge' AND value = coalesce({row}.achievement_badge, '{DEFAULT_BADGE}')) "
+            f"OR (dimension = 'points' AND value = CAST(coalesce({row}.skill_points, 0) AS TEXT))")
+
+
+def _count(row):
+    return f"""INSERT INTO employee_summary (dimension, value, headcount, experience_tenths)
+        VALUES ('role', {row}.current_role, 1, CAST(round({row}.experience * 10) AS INTEGER)),
+               ('badge', coalesce({row}.achievement_badge, '{DEFAULT_BADGE}'), 1, 0),
+               ('points', CAST(coalesce({row}.skill_points, 0) AS TEXT), 1, 0)
+        ON CONFLICT (dimension, value) DO UPDATE SET headcount = headcount + 1,
+            experience_tenths = experience_tenths + excluded.experience_tenths;"""
+
+
+def _uncount(row):
+    return f"""UPDATE employee_summary SET headcount = headcount - 1,
+            experience_tenths = experience_tenths - CASE WHEN dimension = 'role'
+                THEN CAST(round({row}.experience * 10) AS INTEGER) ELSE 0 END
+        WHERE {_keys(row)};
+        DELETE FROM employee_summary WHERE headcount <= 0 AND ({_keys(row)});"""
+
+
+# The triggers run inside whatever statement writes employees, ORM flush or Core executemany alike, so the
+# totals can't drift from the table. An update moves the row out of its old totals and into the new ones.
+ANALYTICS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS employee_summary_insert AFTER INSERT ON employees BEGIN
+        {_count('new')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS employee_summary_delete AFTER DELETE ON employees BEGIN
+        {_uncount('old')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS employee_summary_update
+    AFTER UPDATE OF current_role, experience, achievement_badge, skill_points ON employees BEGIN
+        {_uncount('old')}
+        {_count('new')}
+    END""",
+]
+
+for statement in ANALYTICS_TRIGGERS:
+    event.listen(Employee.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+_ready_databases = set()  # URLs of SQLite databases known to have the triggers
+_refreshed = {}  # {database URL: monotonic time of the last rebuild}, for databases without the triggers
+_analytics_lock = Lock()
+
+
+def usesTriggers():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def _recountQueries():
+    # employee_summary's rows as counted afresh from employees, one select per dimension
+    badge = db.func.coalesce(Employee.achievement_badge, DEFAULT_BADGE)
+    points = db.cast(db.func.coalesce(Employee.skill_points, 0), db.String)
+    tenths = db.cast(db.func.round(Employee.experience * 10), db.Integer)
+    count = db.func.count()
+    return (db.select(db.literal('role'), Employee.current_role, count, db.func.sum(tenths))
+            .group_by(Employee.current_role),
+            db.select(db.literal('badge'), badge, count, db.literal(0)).group_by(badge),
+            db.select(db.literal('points'), points, count, db.literal(0)).group_by(points))
+
+
+def rebuildAnalytics():
+    # Recounts the totals from employees in one transaction. SQLite only needs it to add the triggers to an
+    # existing database or to repair the totals; other databases run it every ANALYTICS_REFRESH_SECONDS.
+    table = EmployeeSummary.__table__
+    with db.engine.begin() as connection:
+        table.create(connection, checkfirst=True)
+        if connection.dialect.name == 'sqlite':
+            for statement in ANALYTICS_TRIGGERS:
+                connection.execute(text(statement))
+        connection.execute(db.delete(table))
+        for query in _recountQueries():
+            connection.execute(db.insert(table).from_select(['dimension', 'value', 'headcount', 'experience_tenths'],
+                                                            query))
+    _refreshed[str(db.engine.url)] = monotonic()
+
+
+def analyticsDrift():
+    # employee_summary rows that differ from a fresh count, as {(dimension, value): (stored, counted)}
+    # where each side is (headcount, experience_tenths) or None
+    table = EmployeeSummary.__table__
+    with db.engine.begin() as connection:
+        table.create(connection, checkfirst=True)
+        stored = {(row[0], row[1]): (row[2], row[3]) for row in connection.execute(
+            db.select(table.c.dimension, table.c.value, table.c.headcount, table.c.experience_tenths))}
+        counted = {(row[0], row[1]): (row[2], row[3] or 0) for query in _recountQueries()
+                   for row in connection.execute(query)}
+    return {key: (stored.get(key), counted.get(key)) for key in stored.keys() | counted.keys()
+            if stored.get(key) != counted.get(key)}
+
+
+def triggersInstalled():
+    return usesTriggers() and db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'employee_summary_update'")).first() is not None
+
+
+def ensureAnalytics():
+    url = str(db.engine.url)
+    with _analytics_lock:
+        if usesTriggers():
+            if url not in _ready_databases:
+                if not triggersInstalled():
+                    rebuildAnalytics()
+                _ready_databases.add(url)
+        elif monotonic() - _refreshed.get(url, float('-inf')) >= current_app.config['ANALYTICS_REFRESH_SECONDS']:
+            rebuildAnalytics()
+
+
+def percentiles(histogram, total, wanted=PERCENTILES):
+    # {p: value} by nearest rank, from (value, headcount) pairs sorted by value
+    result = {}
+    targets = [(p, max(-(-p * total // 100), 1)) for p in wanted]  # ceil(p% of total), at least the first
+    seen = 0
+    for value, headcount in histogram:
+        seen += headcount
+        while targets and targets[0][1] <= seen:
+            result[targets.pop(0)[0]] = value
+    return result
+
+
+def organisationAnalytics():
+    ensureAnalytics()
+    table = EmployeeSummary.__table__
+    rows = db.session.execute(db.select(table.c.dimension, table.c.value, table.c.headcount,
+                                        table.c.experience_tenths)).all()
+    roles, badges, histogram = [], {}, []
+    for dimension, value, headcount, experience_tenths in rows:
+        if dimension == 'role':
+            roles.append(RoleStats(value, headcount, round(experience_tenths / headcount / 10, 1)))
+        elif dimension == 'badge':
+            badges[value] = headcount
+        else:
+            histogram.append((int(value), headcount))
+    headcount = sum(role.headcount for role in roles)
+    total_tenths = sum(row.experience_tenths for row in rows if row.dimension == 'role')
+    histogram.sort()
+    return Analytics(headcount=headcount,
+                     average_experience=round(total_tenths / headcount / 10, 1) if headcount else None,
+                     roles=sorted(roles, key=lambda role: (-role.headcount, role.role)),
+                     badges=[(badge, badges.get(badge, 0)) for badge in [b for m, b in BADGE_TIERS] + [DEFAULT_BADGE]],
+                     percentiles=percentiles(histogram, headcount),
+                     max_points=histogram[-1][0] if histogram else None)
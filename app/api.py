@@ -0,0 +1,184 @@
+from datetime import datetime
+from app import db
+from app.models import Employee, badgeFor, badgeCase, markEmployeesChanged
+from app.directory import filterEmployees, PAGE_SIZE, MAX_PAGE_SIZE
+from app.readmodel import EMPLOYEE_FIELDS, selectEmployees, readRows, rowMapper
+from app.skills import syncEmployeeSkills, chunks
+from app.plans import forgetPlans, PLAN_FIELDS
+from app.emails import normalizeEmail, emailKey, emailsInUse
+from app.audit import auditing, auditChanges
+
+# Most ids one batch GET may ask for
+MAX_BATCH_IDS = 500
+
+# Clients pick a subset of the fields with fields=
+ALL_FIELDS = EMPLOYEE_FIELDS
+
+# Fields a PATCH may change, with their longest allowed text. achievement_badge follows skill_points.
+TEXT_LIMITS = {'name': 64, 'email': 64, 'current_role': 64, 'past_roles': None, 'skills': None,
+               'educational_background': None}
+OPTIONAL_FIELDS = {'past_roles'}
+EDITABLE_FIELDS = set(TEXT_LIMITS) | {'date_of_joining', 'experience', 'skill_points'}
+
+
+def parseFields(text):
+    # The requested fields in EMPLOYEE_FIELDS order, always with employee_id, plus any names that aren't fields
+    if not text:
+        return ALL_FIELDS, []
+    wanted = {name.strip() for name in text.split(',') if name.strip()}
+    unknown = sorted(wanted - set(ALL_FIELDS))
+    return tuple(name for name in ALL_FIELDS if name in wanted or name == 'employee_id'), unknown
+
+
+def employeePage(fields, after=None, limit=PAGE_SIZE, **filters):
+    # One page in employee_id order plus the cursor for the next page (None on the last page)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    query = filterEmployees(selectEmployees(fields), **filters)
+    if after is not None:
+        query = query.where(Employee.employee_id > after)
+    rows = readRows(query.order_by(Employee.employee_id).limit(limit + 1)).all()
+    next_after = rows[limit - 1].employee_id if len(rows) > limit else None
+    mapRow = rowMapper(fields)
+    return [mapRow(row) for row in rows[:limit]], next_after
+
+
+def employeesById(fields, employee_ids):
+    # {employee_id: record} for those of the ids that exist
+    mapRow = rowMapper(fields)
+    found = {}
+    for ids in chunks(set(employee_ids)):
+        query = selectEmployees(fields).where(Employee.employee_id.in_(ids))
+        for row in readRows(query):
+            found[row.employee_id] = mapRow(row)
+    return found
+
+
+def parseEmployeeChange(record, index, errors):
+    # Returns one PATCH entry as a dict of employees columns (with employee_id), or None after recording why not
+    if not isinstance(record, dict):
+        errors.append(f'Change {index} is not an object')
+        return None
+    employee_id = record.get('employee_id')
+    if not isinstance(employee_id, int) or isinstance(employee_id, bool):
+        errors.append(f'Change {index} needs an integer employee_id')
+        return None
+    fields = set(record) - {'employee_id'}
+    if not fields:
+        errors.append(f'Change {index} has no fields to update')
+        return None
+    unknown = sorted(fields - EDITABLE_FIELDS)
+    if unknown:
+        errors.append(f'Change {index} has fields that cannot be updated: {", ".join(unknown)}')
+        return None
+    valid = True
+    change = dict(employee_id=employee_id)
+    for field in sorted(fields):
+        value = record[field]
+        if field in TEXT_LIMITS:
+            if value is None and field in OPTIONAL_FIELDS:
+                change[field] = None
+                continue
+            limit = TEXT_LIMITS[field]
+            if not isinstance(value, str) or not value.strip() or (limit and len(value) > limit):
+                errors.append(f'Change {index} has an invalid {field}: it must be non-empty text'
+                              + (f' of at most {limit} characters' if limit else ''))
+                valid = False
+            change[field] = value
+        elif field == 'date_of_joining':
+            try:
+                change[field] = datetime.strptime(value, '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                errors.append(f'Change {index} has an invalid date_of_joining: it must be YYYY-MM-DD')
+                valid = False
+        elif field == 'experience':
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 <= value < 1000:
+                errors.append(f'Change {index} has an invalid experience: it must be a number from 0 to 999.9')
+                valid = False
+            change[field] = value
+        elif field == 'skill_points':
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                errors.append(f'Change {index} has an invalid skill_points: it must be a whole number from 0')
+                valid = False
+            change[field] = value
+    if valid and 'email' in change:
+        email, reason = normalizeEmail(change['email'])
+        if email is None:
+            errors.append(f'Change {index} has an invalid email: "{change["email"]}"')
+            valid = False
+        change['email'] = email
+    return change if valid else None
+
+
+def _currentValues(merged):
+    # {employee_id: {field: value}} of the fields about to change, locked until the transaction ends where the
+    # database supports it
+    table = Employee.__table__
+    fields = sorted({field for change in merged.values() for field in _changedValues(change)})
+    columns = [table.c.employee_id] + [table.c[field] for field in fields]
+    current = {}
+    for ids in chunks(merged):
+        for row in readRows(db.select(*columns).where(table.c.employee_id.in_(ids))
+                            .with_for_update()):
+            current[row.employee_id] = {field: row[index] for index, field in enumerate(fields, start=1)}
+    return current
+
+
+def _changedValues(change):
+    values = {field: value for field, value in change.items() if field != 'employee_id'}
+    if 'skill_points' in values:
+        values['achievement_badge'] = badgeFor(values['skill_points'])
+    return values
+
+
+def _mergeChanges(changes):
+    # {employee_id: change}, later changes to the same employee winning
+    merged = {}
+    for change in changes:
+        merged.setdefault(change['employee_id'], {}).update(change)
+    return merged
+
+
+def emailConflicts(changes):
+    # The emailKeys of addresses the changes would give an employee while another employee has, or is
+    # also given, the same address in any case. The unique index alone only catches exact duplicates.
+    claimed = {employee_id: emailKey(change['email'])
+               for employee_id, change in _mergeChanges(changes).items() if 'email' in change}
+    conflicts = set()
+    claimants = {}
+    for employee_id, key in claimed.items():
+        if claimants.setdefault(key, employee_id) != employee_id:
+            conflicts.add(key)
+    # An owner who is given a new address in the same changes frees the old one
+    conflicts.update(key for key, owner in emailsInUse(claimed.values()).items() if owner not in claimed)
+    return sorted(conflicts)
+
+
+def applyEmployeeChanges(session, changes):
+    # Writes parsed changes in the caller's transaction: one executemany UPDATE per distinct set of changed
+    # fields, then the skills, plan and cache bookkeeping the ORM listeners would have done. Later changes
+    # to the same employee win. Returns the number of employees updated.
+    merged = _mergeChanges(changes)
+    groups = {}  # {changed fields: [parameters]}
+    for employee_id, change in merged.items():
+        fields = tuple(sorted(field for field in change if field != 'employee_id'))
+        groups.setdefault(fields, []).append(
+            dict({f'new_{field}': change[field] for field in fields}, e_id=employee_id))
+    table = Employee.__table__
+    before = _currentValues(merged) if auditing() else None
+    for fields, parameters in groups.items():
+        values = {field: db.bindparam(f'new_{field}', type_=table.c[field].type) for field in fields}
+        if 'skill_points' in values:
+            values['achievement_badge'] = badgeCase(values['skill_points'])
+        statement = db.update(table).where(table.c.employee_id == db.bindparam('e_id')).values(values)
+        for chunk in chunks(parameters):
+            session.execute(statement, chunk)
+    skills = {employee_id: change['skills'] for employee_id, change in merged.items() if 'skills' in change}
+    if skills:
+        syncEmployeeSkills(session, skills)
+    forgetPlans(session, [employee_id for employee_id, change in merged.items()
+                          if any(field in change for field in PLAN_FIELDS)])
+    markEmployeesChanged(session)
+    if before is not None:
+        auditChanges(session, 'update', [(employee_id, before[employee_id], _changedValues(change))
+                                         for employee_id, change in merged.items() if employee_id in before])
+    return len(merged)
@@ -0,0 +1,124 @@
+from app import db
+from app.models import Employee, Assessment, Goal, badgeFor, badgeCase, markEmployeesChanged
+from app.skills import rateSkills, chunks
+from app.plans import forgetPlans
+from app.audit import auditing, auditChanges
+
+# Skill points an assessment earns from its supervisor rating, highest tier first. Self-ratings earn nothing.
+ASSESSMENT_POINTS = [(9, 3), (7, 2), (5, 1)]
+MIN_RATING, MAX_RATING = 1, 10
+TEXT_FIELDS = ['self_assessed_skills', 'new_competencies', 'supervisor_assessed_skills', 'future_skills']
+RATING_FIELDS = ['self_rating', 'supervisor_rating']
+HISTORY_SIZE = 20
+
+
+def assessmentPoints(supervisor_rating):
+    for minimum, points in ASSESSMENT_POINTS:
+        if supervisor_rating is not None and supervisor_rating >= minimum:
+            return points
+    return 0
+
+
+def parseAssessment(record, index, errors):
+    # Returns one submitted assessment as a dict of assessments columns, or None after recording why not
+    if not isinstance(record, dict):
+        errors.append(f'Assessment {index} is not an object')
+        return None
+    valid = True
+    employee_id = record.get('employee_id')
+    if not isinstance(employee_id, int) or isinstance(employee_id, bool):
+        errors.append(f'Assessment {index} needs an integer employee_id')
+        valid = False
+    assessment = dict(employee_id=employee_id)
+    for field in RATING_FIELDS:
+        rating = record.get(field)
+        if rating is not None and (not isinstance(rating, int) or isinstance(rating, bool)
+                                   or not MIN_RATING <= rating <= MAX_RATING):
+            errors.append(f'Assessment {index} has an invalid {field}: it must be {MIN_RATING} to {MAX_RATING}')
+            valid = False
+        assessment[field] = rating
+    if assessment['self_rating'] is None and assessment['supervisor_rating'] is None:
+        errors.append(f'Assessment {index} has neither a self_rating nor a supervisor_rating')
+        valid = False
+    for field in TEXT_FIELDS:
+        text = record.get(field)
+        if text is not None and not isinstance(text, str):
+            errors.append(f'Assessment {index} has a non-text {field}')
+            valid = False
+        assessment[field] = text
+    return assessment if valid else None
+
+
+def missingEmployees(employee_ids):
+    ids = set(employee_ids)
+    found = set()
+    for chunk in chunks(ids):
+        found.update(db.session.execute(db.select(Employee.employee_id)
+                                        .where(Employee.employee_id.in_(chunk))).scalars())
+    return ids - found
+
+
+def awardPoints(session, points):
+    # Adds {employee_id: points} to skill_points with an UPDATE that reads and writes the row in one
+    # statement, so concurrent awards can't lose each other, and recomputes the badge from the new total
+    awards = [dict(e_id=employee_id, points=amount) for employee_id, amount in points.items() if amount]
+    if not awards:
+        return
+    table = Employee.__table__
+    total = db.func.coalesce(table.c.skill_points, 0) + db.bindparam('points', type_=db.Integer)
+    session.execute(db.update(table).where(table.c.employee_id == db.bindparam('e_id'))
+                    .values(skill_points=total, achievement_badge=badgeCase(total)), awards)
+    markEmployeesChanged(session)
+    if auditing():
+        # Read back once the rows are locked by the update; the old badge is the one the old total earned
+        changes = []
+        for awarded in chunks(award['e_id'] for award in awards):
+            rows = session.connection().execute(
+                db.select(table.c.employee_id, table.c.skill_points, table.c.achievement_badge)
+                .where(table.c.employee_id.in_(awarded)))
+            for employee_id, skill_points, badge in rows:
+                old_points = skill_points - points[employee_id]
+                changes.append((employee_id, dict(skill_points=old_points, achievement_badge=badgeFor(old_points)),
+                                dict(skill_points=skill_points, achievement_badge=badge)))
+        auditChanges(session, 'update', changes)
+
+
+def recordAssessments(session, assessments, assessor_id=None):
+    # Stores parsed assessments, their skill ratings and the points they earn, all in the caller's
+    # transaction. Returns the total points awarded.
+    points = {}
+    rows = []
+    for assessment in assessments:
+        awarded = assessmentPoints(assessment['supervisor_rating'])
+        points[assessment['employee_id']] = points.get(assessment['employee_id'], 0) + awarded
+        rows.append(dict(assessment, assessor_id=assessor_id, points_awarded=awarded))
+    for chunk in chunks(rows):
+        session.execute(db.insert(Assessment.__table__), chunk)
+    rateSkills(session, [(a['employee_id'], a['self_assessed_skills'], dict(self_rating=a['self_rating']))
+                         for a in assessments if a['self_rating'] is not None] +
+               [(a['employee_id'], a['supervisor_assessed_skills'], dict(supervisor_rating=a['supervisor_rating']))
+                for a in assessments if a['supervisor_rating'] is not None])
+    awardPoints(session, points)
+    forgetPlans(session, points)
+    return sum(points.values())
+
+
+def _history(model, key, employee_id, before, limit):
+    # Newest first from the (employee_id, created_at) index; `before` is the id of the last entry already shown
+    query = db.select(model).where(model.employee_id == employee_id)
+    if before is not None:
+        last = db.session.get(model, before)
+        if last is not None:
+            query = query.where(db.or_(model.created_at < last.created_at,
+                                       db.and_(model.created_at == last.created_at, key < before)))
+    entries = db.session.execute(query.order_by(model.created_at.desc(), key.desc()).limit(limit + 1)).scalars().all()
+    next_before = getattr(entries[limit - 1], key.key) if len(entries) > limit else None
+    return entries[:limit], next_before
+
+
+def assessmentHistory(employee_id, before=None, limit=HISTORY_SIZE):
+    return _history(Assessment, Assessment.assessment_id, employee_id, before, limit)
+
+
+def goalHistory(employee_id, before=None, limit=HISTORY_SIZE):
+    return _history(Goal, Goal.goal_id, employee_id, before, limit)
@@ -0,0 +1,219 @@
+import atexit
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from threading import Event, Lock, Thread
+from flask import current_app, has_app_context, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from app.metrics import Counter
+from app.models import Employee, AuditEntry
+from app.skills import chunks
+
+# Every employees column but the key is recorded
+AUDITED_FIELDS = tuple(column.key for column in Employee.__table__.columns if column.key != 'employee_id')
+# Most entries one changesSince call returns
+MAX_CHANGES = 1000
+
+audit_entries = Counter('audit_entries_total', 'Employee changes written to the audit log')
+audit_dropped = Counter('audit_entries_dropped_total', 'Employee changes dropped because the audit log was unavailable')
+
+_ready_databases = set()  # URLs of audit databases known to have the audit_log table
+_ready_lock = Lock()
+
+
+def _ensureAuditTable(engine):
+    with _ready_lock:
+        if str(engine.url) not in _ready_databases:
+            AuditEntry.__table__.create(engine, checkfirst=True)
+            _ready_databases.add(str(engine.url))
+
+
+def _jsonValue(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _entry(operation, employee_id, before, after):
+    # An audit_log row without its commit time; an update that changed nothing gives None
+    before = {field: _jsonValue(value) for field, value in before.items()} if before is not None else None
+    after = {field: _jsonValue(value) for field, value in after.items()} if after is not None else None
+    if operation == 'update':
+        changed = [field for field in after if before.get(field) != after[field]]
+        if not changed:
+            return None
+        before = {field: before.get(field) for field in changed}
+        after = {field: after[field] for field in changed}
+    return dict(operation=operation, employee_id=employee_id,
+                before=json.dumps(before) if before is not None else None,
+                after=json.dumps(after) if after is not None else None)
+
+
+class AuditLog:
+    # Entries committed in this process, waiting to be written to the audit database. A background thread
+    # writes them in one transaction per flush, every flush_seconds or as soon as batch_size are waiting, so
+    # requests never wait on the log. If the log can't be written the entries are kept for the next flush,
+    # up to max_pending of them; entries still waiting when the process is killed are lost.
+    def __init__(self, engine, batch_size, flush_seconds, max_pending, logger):
+        self.engine = engine
+        self.batch_size, self.flush_seconds, self.max_pending = batch_size, flush_seconds, max_pending
+        self.logger = logger
+        self.pending = []
+        self.lock = Lock()
+        self.flush_lock = Lock()  # One flush at a time, so entries are written in the order they were committed
+        self.wake = Event()
+        self.thread = None
+        self.pid = None
+
+    def append(self, entries):
+        with self.lock:
+            if self.pid != os.getpid():
+                # A forked worker starts with its own thread; the parent writes what it had already queued
+                self.pid, self.thread, self.pending = os.getpid(), None, []
+            self.pending.extend(entries)
+            self._dropOverflow()
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name='audit-log', daemon=True)
+                self.thread.start()
+            if len(self.pending) >= self.batch_size:
+                self.wake.set()
+
+    def _dropOverflow(self):
+        overflow = len(self.pending) - self.max_pending
+        if overflow > 0:
+            del self.pending[:overflow]
+            audit_dropped.inc(overflow)
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        # Writes every waiting entry; returns how many were written
+        with self.flush_lock:
+            with self.lock:
+                entries, self.pending = self.pending, []
+            if not entries:
+                return 0
+            try:
+                _ensureAuditTable(self.engine)
+                with self.engine.begin() as connection:
+                    for chunk in chunks(entries, self.batch_size):
+                        connection.execute(db.insert(AuditEntry.__table__), chunk)
+            except Exception:
+                self.logger.exception('Writing %d audit log entries failed; retrying on the next flush', len(entries))
+                with self.lock:
+                    self.pending[:0] = entries
+                    self._dropOverflow()
+                return 0
+            audit_entries.inc(len(entries))
+            return len(entries)
+
+
+def initAudit(app):
+    if app.config['AUDIT_ENABLED']:
+        with app.app_context():
+            engine = db.engines['audit']
+        log = app.extensions['audit'] = AuditLog(engine, app.config['AUDIT_BATCH_SIZE'],
+                                                 app.config['AUDIT_FLUSH_SECONDS'], app.config['AUDIT_MAX_PENDING'],
+                                                 app.logger)
+        atexit.register(log.flush)
+
+
+def _auditLog():
+    return current_app.extensions.get('audit') if has_app_context() else None
+
+
+def auditing():
+    # Whether changes are being logged, so Core writers can skip reading the values they would record
+    return _auditLog() is not None
+
+
+def auditAs(actor_id=None, source=None, session=None):
+    # Who and what to record for the session's changes when there is no logged in user, e.g. in a job
+    info = (session or db.session).info
+    info['audit_actor'] = actor_id
+    info['audit_source'] = source
+
+
+def _origin(session):
+    actor = session.info.get('audit_actor')
+    source = session.info.get('audit_source')
+    if has_request_context():
+        if actor is None and current_user.is_authenticated:
+            actor = current_user.user_id
+        source = source or request.endpoint
+    return dict(actor_id=actor, source=source)
+
+
+def auditChanges(session, operation, changes):
+    # For writes that bypass the unit of work (Core INSERT/UPDATE statements): records
+    # [(employee_id, fields before, fields after)] to be logged if the session commits
+    if not auditing():
+        return
+    origin = _origin(session)
+    entries = [_entry(operation, employee_id, before, after) for employee_id, before, after in changes]
+    session.info.setdefault('audit_entries', []).extend(dict(entry, **origin) for entry in entries if entry)
+
+
+@event.listens_for(Session, 'after_flush')
+def captureEmployeeChanges(session, flush_context):
+    # Reads the changes from attribute history, which the flush hasn't reset yet
+    if not auditing():
+        return
+    inserts, updates, deletes = [], [], []
+    for obj in session.new:
+        if isinstance(obj, Employee):
+            inserts.append((obj.employee_id, None, {field: getattr(obj, field) for field in AUDITED_FIELDS}))
+    for obj in session.dirty:
+        if isinstance(obj, Employee):
+            attrs = inspect(obj).attrs
+            before, after = {}, {}
+            for field in AUDITED_FIELDS:
+                history = attrs[field].history
+                if history.added:
+                    before[field] = history.deleted[0] if history.deleted else None
+                    after[field] = history.added[0]
+            updates.append((obj.employee_id, before, after))
+    for obj in session.deleted:
+        if isinstance(obj, Employee):
+            deletes.append((obj.employee_id, {field: getattr(obj, field) for field in AUDITED_FIELDS}, None))
+    for operation, changes in (('insert', inserts), ('update', updates), ('delete', deletes)):
+        if changes:
+            auditChanges(session, operation, changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def logCommittedChanges(session):
+    entries = session.info.pop('audit_entries', None)
+    log = _auditLog()
+    if entries and log is not None:
+        recorded_at = datetime.utcnow()
+        log.append([dict(entry, recorded_at=recorded_at) for entry in entries])
+
+
+@event.listens_for(Session, 'after_rollback')
+def discardChanges(session):
+    session.info.pop('audit_entries', None)
+
+
+def changesSince(after=0, limit=MAX_CHANGES, employee_id=None):
+    # Logged changes with ids above `after`, oldest first, including any still waiting to be written.
+    # Replaying them from 0 in order rebuilds every employee's history.
+    log = _auditLog()
+    if log is not None:
+        log.flush()
+    _ensureAuditTable(db.engines['audit'])
+    query = db.select(AuditEntry).where(AuditEntry.entry_id > after)
+    if employee_id is not None:
+        query = query.where(AuditEntry.employee_id == employee_id)
+    query = query.order_by(AuditEntry.entry_id).limit(max(1, min(limit, MAX_CHANGES)))
+    return db.session.execute(query).scalars().all()
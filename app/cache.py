@@ -0,0 +1,149 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from time import monotonic, time
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from markupsafe import Markup
+from app import basedir
+from app.models import onEmployeesCommitted
+
+# Bumped whenever employee data changes. It is part of every cache key and ETag, so a write makes
+# all earlier entries unreachable at once and they age out of the backend on their own.
+VERSION_KEY = 'employees:version'
+
+
+class MemoryCache:
+    # In-process LRU with per-entry expiry. Each worker process has its own copy and its own version
+    # counter, so a write seen by one worker reaches the others' caches only after CACHE_DEFAULT_TTL.
+    shared = False
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (monotonic() + ttl if ttl else None, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def incr(self, key):
+        with self.lock:
+            expires, value = self.entries.get(key, (None, 0))
+            self.entries[key] = (None, value + 1)
+            return value + 1
+
+
+class RedisCache:
+    # Shared by every worker, for deployments running several processes. Works with Redis or any
+    # server speaking its protocol, and needs the optional redis package.
+    shared = True
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND=redis needs the redis package: pip install redis')
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return None
+        return int(value) if key == VERSION_KEY else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value), ex=ttl)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+def _templatesStamp():
+    # Changes whenever a template does, so a deploy with new markup doesn't answer 304 for old pages
+    templates = os.path.join(basedir, 'templates')
+    latest = max(os.path.getmtime(os.path.join(root, name))
+                 for root, dirs, files in os.walk(templates) for name in files)
+    return str(int(latest))
+
+
+def initCache(app):
+    if app.config['CACHE_BACKEND'] == 'redis':
+        app.extensions['fragment_cache'] = RedisCache(app.config['CACHE_REDIS_URL'])
+    else:
+        app.extensions['fragment_cache'] = MemoryCache(app.config['CACHE_MAX_ENTRIES'])
+    app.config.setdefault('ETAG_SALT', _templatesStamp())
+
+
+def _backend():
+    return current_app.extensions['fragment_cache']
+
+
+def dataVersion():
+    backend = _backend()
+    version = backend.get(VERSION_KEY) or 0
+    if backend.shared:
+        return str(version)
+    # Writes made by other worker processes never reach a per-process counter, so the version also
+    # rolls over every CACHE_DEFAULT_TTL to bound how stale those workers' pages can get
+    return f"{version}.{int(time() // current_app.config['CACHE_DEFAULT_TTL'])}"
+
+
+@onEmployeesCommitted
+def bumpDataVersion():
+    _backend().incr(VERSION_KEY)
+
+
+def _userKey():
+    return str(current_user.user_id) if current_user.is_authenticated else 'anonymous'
+
+
+def fragment(name, render, *key_parts, per_user=False):
+    # Rendered HTML for a piece of a page, reused until employee data changes or the entry expires
+    parts = [name, dataVersion()] + [str(part) for part in key_parts]
+    if per_user:
+        parts.append(_userKey())
+    key = 'fragment:' + ':'.join(parts)
+    html = _backend().get(key)
+    if html is None:
+        html = render()
+        _backend().set(key, html, current_app.config['CACHE_DEFAULT_TTL'])
+    return Markup(html)
+
+
+def etagged(view):
+    # Answers 304 Not Modified, before the view runs, when the browser's copy of the page was made from
+    # the same employee data for the same user. Pages with a flash message waiting are always rendered.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if '_flashes' in session:
+            return view(*args, **kwargs)
+        stamp = f"{current_app.config['ETAG_SALT']}:{dataVersion()}:{_userKey()}:{request.full_path}"
+        etag = hashlib.sha1(stamp.encode()).hexdigest()
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
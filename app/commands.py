@@ -0,0 +1,151 @@
+import click
+import json
+from time import perf_counter, sleep
+from flask import Blueprint, current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import db
+from app.search import rebuildSearchIndex
+from app.analytics import rebuildAnalytics
+from app.audit import auditAs, changesSince
+from app.migrations import (migrationStates, runMigrations, verifyEmployees, repairAllBadges,
+                            createMissingIndexes, BACKFILL_BATCH_SIZE)
+from app.skills import ingestAllSkills
+from app.plans import regenerateAllPlans, PLAN_BATCH_SIZE
+
+# Commands are registered at the top level, e.g. "flask init-db"
+bp = Blueprint('commands', __name__, cli_group=None)
+
+
+@bp.cli.command('backfill-badges')
+@click.option('--batch-size', default=BACKFILL_BATCH_SIZE, help='Employees each transaction covers.')
+def backfillBadges(batch_size):
+    """Recompute the achievement badge of every employee whose badge disagrees with their points."""
+    auditAs(source='backfill-badges')
+    employees, repaired = repairAllBadges(batch_size)
+    click.echo(f'Updated achievement badges for {repaired} of {employees} employees')
+
+
+@bp.cli.command('init-db')
+def initDb():
+    """Create missing tables, and any indexes missing from existing tables."""
+    db.create_all()
+    for name in createMissingIndexes():
+        click.echo(f'Built index {name}')
+    click.echo('Database schema is up to date')
+
+
+@bp.cli.command('migrate')
+@click.option('--batch-size', default=BACKFILL_BATCH_SIZE, help='Employees each backfill transaction covers.')
+@click.option('--list', 'list_only', is_flag=True, help='Show each migration\'s state without running any.')
+def migrate(batch_size, list_only):
+    """Apply pending schema migrations and backfills, resuming any that were interrupted."""
+    if list_only:
+        for migration, state in migrationStates():
+            if state is None:
+                status = 'pending'
+            elif state.finished_at is None:
+                status = f'interrupted after employee {state.resume_after}, {state.rows_done} done'
+            else:
+                status = f'applied {state.finished_at:%Y-%m-%d %H:%M}, {state.rows_changed} rows changed'
+            click.echo(f'{migration.version:>4} {migration.name:<20} {status}')
+        return
+
+    def progress(state, total):
+        click.echo(f'{state.name}: {state.rows_done}/{total} employees, {state.rows_changed} changed', err=True)
+
+    applied = runMigrations(batch_size=batch_size, progress=progress)
+    for migration in applied:
+        click.echo(f'Applied {migration.version} {migration.name}: {migration.description}')
+    click.echo('Database is up to date' if applied else 'No pending migrations')
+
+
+@bp.cli.command('verify-employees')
+@click.option('--repair', is_flag=True, help='Fix what is found instead of only reporting it.')
+@click.option('--batch-size', default=BACKFILL_BATCH_SIZE, help='Employees checked per transaction.')
+def verifyEmployeesCommand(repair, batch_size):
+    """Check every employee's skill points and badge, and the analytics totals, optionally repairing them."""
+    result = verifyEmployees(repair=repair, batch_size=batch_size,
+                             progress=lambda done, found: click.echo(f'{done} checked, {found} problems', err=True))
+    click.echo(f'{result.employees} employees checked: {result.badge_problems} with missing points or a wrong '
+               f'badge' + (f', {result.repaired} repaired' if repair else ''))
+    if result.analytics_drift:
+        click.echo(f'{result.analytics_drift} analytics totals were out of step'
+                   + (', rebuilt' if result.analytics_rebuilt else '; run with --repair to rebuild them'))
+    if (result.badge_problems or result.analytics_drift) and not repair:
+        raise SystemExit(1)
+
+
+@bp.cli.command('rebuild-search-index')
+def rebuildSearchIndexCommand():
+    """Create the employee full-text search index if needed and re-index every employee."""
+    if rebuildSearchIndex():
+        click.echo('Employee search index rebuilt')
+    else:
+        click.echo('The full-text search index needs SQLite; other databases search without it')
+
+
+@bp.cli.command('rebuild-analytics')
+def rebuildAnalyticsCommand():
+    """Recount the analytics totals from every employee, adding the SQLite triggers if needed."""
+    rebuildAnalytics()
+    click.echo('Analytics totals rebuilt')
+
+
+@bp.cli.command('audit-log')
+@click.option('--after', default=0, help='Print entries with ids above this one.')
+@click.option('--employee', type=int, default=None, help='Only this employee\'s changes.')
+@click.option('--follow', is_flag=True, help='Keep printing new entries as they are logged.')
+def auditLog(after, employee, follow):
+    """Print logged employee changes as JSON lines, oldest first, to replay or tail them."""
+    while True:
+        entries = changesSince(after, employee_id=employee)
+        for entry in entries:
+            click.echo(json.dumps(entry.to_dict()))
+        if entries:
+            after = entries[-1].entry_id
+        elif not follow:
+            break
+        else:
+            db.session.rollback()  # End the read transaction so the next poll sees new entries
+            sleep(current_app.config['AUDIT_FLUSH_SECONDS'])
+
+
+@bp.cli.command('ingest-skills')
+def ingestSkills():
+    """Populate the skills taxonomy from every employee's skills text."""
+    total = ingestAllSkills()
+    click.echo(f'Ingested skills for {total} employees')
+
+
+@bp.cli.command('generate-plans')
+@click.option('--workers', type=int, default=None, help='Worker processes; defaults to one per CPU.')
+@click.option('--batch-size', default=PLAN_BATCH_SIZE, help='Employees sent to a worker at a time.')
+def generatePlansCommand(workers, batch_size):
+    """Regenerate every employee's development plan in parallel worker processes."""
+    started = perf_counter()
+    total = regenerateAllPlans(workers=workers, batch_size=batch_size,
+                               progress=lambda done: click.echo(f'{done} plans generated', err=True))
+    click.echo(f'Generated development plans for {total} employees in {perf_counter() - started:.1f}s')
+
+
+@bp.cli.command('bench-password-hashing')
+@click.option('--seconds', default=2.0, help='Time spent measuring each hashing method.')
+@click.argument('methods', nargs=-1)
+def benchPasswordHashing(seconds, methods):
+    """Report how many password checks per second each hashing METHOD allows.
+
+    Defaults to the configured method plus a few cheaper and dearer alternatives.
+    """
+    methods = methods or (current_app.config['PASSWORD_HASH_METHOD'], 'scrypt:16384:8:1',
+                          'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000')
+    for method in dict.fromkeys(methods):
+        password_hash = generate_password_hash('benchmark-password', method=method,
+                                               salt_length=current_app.config['PASSWORD_SALT_LENGTH'])
+        checks = 0
+        started = perf_counter()
+        while perf_counter() - started < seconds:
+            check_password_hash(password_hash, 'benchmark-password')
+            checks += 1
+        elapsed = perf_counter() - started
+        marker = ' (configured)' if method == current_app.config['PASSWORD_HASH_METHOD'] else ''
+        click.echo(f'{method:<28} {checks / elapsed:8.1f} logins/sec  {elapsed / checks * 1000:7.1f} ms/login{marker}')
@@ -0,0 +1,68 @@
+from app import db
+from app.models import Employee
+from app.readmodel import selectEmployees, employeeRows
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Sortable columns, each backed by an index. SQLite indexes carry the rowid (employee_id) as their
+# last key, so every one of these also serves the (column, employee_id) keyset order.
+# skill_points is covered by the leaderboard's (skill_points DESC, employee_id) index instead, whose
+# ties run the opposite way to the points, see REVERSED_TIES.
+SORT_COLUMNS = {
+    'id': Employee.employee_id,
+    'name': Employee.name,
+    'role': Employee.current_role,
+    'experience': Employee.experience,
+    'points': Employee.skill_points,
+}
+REVERSED_TIES = {'points'}
+
+
+def filterEmployees(query, role=None, badge=None, min_experience=None, max_experience=None):
+    if role:
+        query = query.where(Employee.current_role == role)
+    if badge:
+        query = query.where(Employee.achievement_badge == badge)
+    if min_experience is not None:
+        query = query.where(Employee.experience >= min_experience)
+    if max_experience is not None:
+        query = query.where(Employee.experience <= max_experience)
+    return query
+
+
+def directoryFilters(args):
+    # The filters filterEmployees accepts, read from query string arguments
+    return dict(role=args.get('role'), badge=args.get('badge'),
+                min_experience=args.get('min_experience', type=float),
+                max_experience=args.get('max_experience', type=float))
+
+
+def _seekPast(column, last, descending, ties_descending):
+    # Rows strictly after `last` in (column, employee_id) order
+    past_id = Employee.employee_id < last.employee_id if ties_descending else Employee.employee_id > last.employee_id
+    if column is Employee.employee_id:
+        return past_id
+    value = getattr(last, column.key)
+    return db.or_(column < value if descending else column > value, db.and_(column == value, past_id))
+
+
+def directoryPage(sort='id', descending=False, after=None, per_page=PAGE_SIZE, **filters):
+    # One page of employees, as read-only EmployeeRows, plus the cursor for the next page (None on the last
+    # page). The cursor is the employee_id of the last row shown; the next page seeks past it rather than
+    # using OFFSET.
+    if sort not in SORT_COLUMNS:
+        sort = 'id'
+    column = SORT_COLUMNS[sort]
+    ties_descending = descending != (sort in REVERSED_TIES)
+    per_page = min(max(per_page, 1), MAX_PAGE_SIZE)
+    query = filterEmployees(selectEmployees(), **filters)
+    if after is not None:
+        last = db.session.execute(db.select(Employee.employee_id, column).where(Employee.employee_id == after)).first()
+        if last is not None:
+            query = query.where(_seekPast(column, last, descending, ties_descending))
+    query = query.order_by(column.desc() if descending else column,
+                           Employee.employee_id.desc() if ties_descending else Employee.employee_id)
+    employees = employeeRows(query.limit(per_page + 1))
+    next_after = employees[per_page - 1].employee_id if len(employees) > per_page else None
+    return employees[:per_page], next_after
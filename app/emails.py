@@ -0,0 +1,115 @@
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from time import monotonic
+from flask import current_app
+from app import db
+from app.models import Employee
+from app.skills import chunks
+
+# Distinct addresses whose validation result each process remembers
+EMAIL_CACHE_SIZE = 100000
+DOMAIN_CACHE_SIZE = 10000
+
+# Whether each recently looked up domain accepts mail, as {domain: (expiry time, deliverable)}
+_domains = OrderedDict()
+_domains_lock = Lock()
+
+
+@lru_cache(maxsize=EMAIL_CACHE_SIZE)
+def normalizeEmail(email):
+    # (normalized address, None) for a valid address, or (None, reason) for an invalid one. Only the syntax is
+    # checked; the domain is lowercased and IDNA normalized while the local part is kept as written.
+    # email_validator is slow to import, so only processes that validate emails load it
+    from email_validator import validate_email, EmailNotValidError
+    try:
+        return validate_email(email, check_deliverability=False).normalized, None
+    except EmailNotValidError as error:
+        return None, str(error)
+
+
+def emailKey(email):
+    # What two addresses must share to count as the same one. normalizeEmail() keeps the local part as
+    # written, and although RFC 5321 lets it be case-sensitive, no mail provider treats it so.
+    return email.lower()
+
+
+def emailsInUse(emails, column=Employee.email, owner=Employee.employee_id):
+    # {emailKey: owner id} for those of the addresses already stored in the column in any case, looked up
+    # a chunk at a time through the lower(email) index
+    taken = {}
+    for keys in chunks({emailKey(email) for email in emails}):
+        taken.update(db.session.execute(db.select(db.func.lower(column), owner)
+                                        .where(db.func.lower(column).in_(keys))).all())
+    return taken
+
+
+def dnsLookup(nameservers=None, port=53, timeout=5.0):
+    # An async function telling whether a domain accepts mail: it has MX records other than a null MX
+    # (RFC 7505), or no MX records but an address (RFC 5321 section 5.1). nameservers defaults to the
+    # system's; point it at a local stub server to check without reaching the internet.
+    import dns.asyncresolver
+    import dns.exception
+    import dns.resolver
+    resolver = dns.asyncresolver.Resolver(configure=not nameservers)
+    if nameservers:
+        resolver.nameservers = list(nameservers)
+        resolver.port = port
+    resolver.lifetime = timeout
+
+    async def accepts(domain):
+        try:
+            answer = await resolver.resolve(domain, 'MX')
+            return any(str(record.exchange) != '.' for record in answer)
+        except dns.resolver.NoAnswer:
+            pass
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoNameservers):
+            return False
+        except dns.exception.Timeout:
+            return True  # Unknown, so the address gets the benefit of the doubt
+        try:
+            await resolver.resolve(domain, 'A')
+            return True
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.resolver.NoNameservers):
+            return False
+        except dns.exception.Timeout:
+            return True
+    return accepts
+
+
+async def _checkDomains(domains, lookup, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def check(domain):
+        async with limit:
+            return domain, await lookup(domain)
+    return dict(await asyncio.gather(*[check(domain) for domain in domains]))
+
+
+def undeliverableEmails(emails, lookup=None):
+    # Those of the (normalized) addresses whose domain doesn't accept mail. Each distinct domain is looked up
+    # once, at most EMAIL_DNS_CONCURRENCY at a time, and remembered for EMAIL_DNS_CACHE_TTL seconds.
+    config = current_app.config
+    domains = {email.rsplit('@', 1)[1] for email in emails}
+    deliverable = {}
+    now = monotonic()
+    with _domains_lock:
+        for domain in domains:
+            entry = _domains.get(domain)
+            if entry is not None and entry[0] > now:
+                deliverable[domain] = entry[1]
+    unknown = domains - set(deliverable)
+    if unknown:
+        lookup = lookup or dnsLookup(config['EMAIL_DNS_NAMESERVERS'], config['EMAIL_DNS_PORT'],
+                                     config['EMAIL_DNS_TIMEOUT'])
+        found = asyncio.run(_checkDomains(unknown, lookup, config['EMAIL_DNS_CONCURRENCY']))
+        deliverable.update(found)
+        expiry = monotonic() + config['EMAIL_DNS_CACHE_TTL']
+        with _domains_lock:
+            for domain, accepts in found.items():
+                _domains[domain] = (expiry, accepts)
+                _domains.move_to_end(domain)
+            while len(_domains) > DOMAIN_CACHE_SIZE:
+                _domains.popitem(last=False)
+    return {email for email in emails if not deliverable[email.rsplit('@', 1)[1]]}
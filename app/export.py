@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+import zlib
+from app import db
+from app.models import Employee
+from app.directory import filterEmployees
+from app.importer import EMPLOYEE_CSV_HEADER
+
+# Rows fetched from the cursor, and written out, at a time; memory use depends on this, not the table size
+EXPORT_BATCH_SIZE = 1000
+
+# In the same order as EMPLOYEE_CSV_HEADER, so an exported CSV can be uploaded again
+EXPORT_COLUMNS = [Employee.name, Employee.email, Employee.date_of_joining, Employee.current_role,
+                  Employee.past_roles, Employee.skills, Employee.experience, Employee.educational_background,
+                  Employee.skill_points, Employee.achievement_badge]
+
+
+def exportBatches(engine, batch_size=EXPORT_BATCH_SIZE, **filters):
+    # Lists of employee rows in employee_id order, read through a server-side cursor on a connection of
+    # its own, so the export can carry on after the request's session has been cleaned up
+    query = filterEmployees(db.select(Employee.employee_id, *EXPORT_COLUMNS), **filters).order_by(Employee.employee_id)
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            yield rows
+
+
+def csvChunks(batches):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(EMPLOYEE_CSV_HEADER)
+    yield out.getvalue().encode()
+    for rows in batches:
+        out.seek(0)
+        out.truncate()
+        writer.writerows([row.name, row.email, row.date_of_joining.isoformat(), row.current_role, row.past_roles,
+                          row.skills, float(row.experience), row.educational_background, row.skill_points,
+                          row.achievement_badge] for row in rows)
+        yield out.getvalue().encode()
+
+
+def ndjsonChunks(batches):
+    # One JSON object per line, with the same keys as Employee.to_dict()
+    for rows in batches:
+        lines = []
+        for row in rows:
+            record = row._asdict()
+            record['date_of_joining'] = row.date_of_joining.isoformat()
+            record['experience'] = float(row.experience)
+            lines.append(json.dumps(record))
+        yield ('\n'.join(lines) + '\n').encode()
+
+
+def gzipChunks(chunks):
+    # Compresses as the chunks go past rather than buffering the whole file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 16 + 15: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -1,12 +1,27 @@
 from datetime import date
+from flask import current_app
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, IntegerField, BooleanField
 from wtforms.fields.datetime import DateField
 from wtforms.fields.numeric import DecimalField
 from wtforms.fields.simple import TextAreaField
-from wtforms.validators import DataRequired, EqualTo, Email, ValidationError
-from app.models import Employee
+from wtforms.validators import DataRequired, EqualTo, ValidationError
+from app import db
+from app.models import User
+from app.emails import normalizeEmail, emailKey, emailsInUse, undeliverableEmails
+
+
+class ValidEmail:
+    # Checks the address through the memoized validation in app.emails, rather than WTForms' Email() which
+    # validates it again on every submission, and replaces the field's data with the normalized address
+    def __call__(self, form, field):
+        email, reason = normalizeEmail(field.data or '')
+        if email is None:
+            raise ValidationError('Invalid email address.')
+        field.data = email
+        if current_app.config['EMAIL_CHECK_DELIVERABILITY'] and undeliverableEmails([email]):
+            raise ValidationError('This email address cannot receive mail. Please check the domain')
 
 
 class LoginForm(FlaskForm):
@@ -18,16 +33,30 @@ class LoginForm(FlaskForm):
 
 class RegistrationForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', validators=[DataRequired(), ValidEmail()])
     password = PasswordField('Password', validators=[DataRequired()])
     confirmpassword = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Register')
 
+    def validate(self, extra_validators=None):
+        # Once everything else is valid, one query looks for both a taken username and a taken email
+        if not super().validate(extra_validators):
+            return False
+        key = emailKey(self.email.data)
+        taken = db.session.execute(db.select(User.username, db.func.lower(User.email)).where(
+            db.or_(User.username == self.username.data, db.func.lower(User.email) == key))).all()
+        for username, email in taken:
+            if username == self.username.data:
+                self.username.errors.append('This username is already taken. Please choose another')
+            if email == key:
+                self.email.errors.append('This email address is already registered. Please choose another')
+        return not taken
+
 
 class AddEmployeeForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
     # employee_id = IntegerField('Employee ID', validators=[DataRequired()])
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', validators=[DataRequired(), ValidEmail()])
     date_of_joining = DateField('Date of Joining', validators=[DataRequired()], default=date.today)
     current_role = StringField('Current Role', validators=[DataRequired()])
     past_roles = TextAreaField('Past Roles')
@@ -39,7 +68,7 @@ class AddEmployeeForm(FlaskForm):
     submit = SubmitField('Add Employee')
 
     def validate_email(self, email):
-        if Employee.query.filter_by(email=email.data).first():
+        if emailsInUse([email.data]):
             raise ValidationError('This email address is already registered. Please choose another')
 
 
@@ -0,0 +1,118 @@
+import csv
+from datetime import datetime
+from time import perf_counter
+from flask import current_app
+from app import db
+from app.models import Employee, badgeFor, markEmployeesChanged
+from app.skills import syncEmployeeSkills
+from app.emails import normalizeEmail, emailKey, emailsInUse, undeliverableEmails
+from app.audit import auditChanges
+
+EMPLOYEE_CSV_HEADER = ['Name', 'Email', 'Date of Joining', 'Current Role', 'Past Roles', 'Skills', 'Experience',
+                       'Educational Background', 'Skill Points', 'Achievement Badge']
+HEADER_ERROR = ('First row of file must be a Header row containing "Name, Email, Date of Joining, Current Role, '
+                'Past Roles, Skills, Experience, Educational Background, Skill Points, Achievement Badge"')
+
+# Rows are checked for duplicates and inserted this many at a time
+BATCH_SIZE = 500
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0  # Valid rows, inserted unless the upload is rejected
+        self.processed = 0  # Every data row read so far
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def parseEmployeeRow(row, row_num, errors):
+    # Returns the row as a dict of employees columns, or None after recording why it can't be imported
+    if len(row) != 10:
+        errors.append(f'Row {row_num} does not have precisely 10 fields')
+        return None
+    valid = True
+    email, reason = normalizeEmail(row[1])
+    if email is None:
+        errors.append(f'Row {row_num} has an invalid email: "{row[1]}"')
+        valid = False
+    try:
+        date_of_joining = datetime.strptime(row[2], '%Y-%m-%d').date()
+        experience = float(row[6])
+        skill_points = int(row[8])
+    except ValueError as e:
+        errors.append(f'Row {row_num} has invalid data: {e}')
+        return None
+    if not valid:
+        return None
+    return dict(name=row[0], email=email, date_of_joining=date_of_joining, current_role=row[3],
+                past_roles=row[4], skills=row[5], experience=experience, educational_background=row[7],
+                skill_points=skill_points, achievement_badge=badgeFor(skill_points))
+
+
+def _flushBatch(batch, result):
+    if not batch:
+        return
+    emails = [record['email'] for row_num, record in batch]
+    existing = emailsInUse(emails)
+    undeliverable = undeliverableEmails(emails) if current_app.config['EMAIL_CHECK_DELIVERABILITY'] else set()
+    for row_num, record in batch:
+        if emailKey(record['email']) in existing:
+            result.errors.append(f'Row {row_num} has email {record["email"]}, which is already in use')
+        elif record['email'] in undeliverable:
+            result.errors.append(f'Row {row_num} has email {record["email"]}, whose domain does not accept mail')
+    # Once any row has failed the upload is rejected, so later batches are only validated
+    if not result.errors:
+        records = [record for row_num, record in batch]
+        employee_ids = db.session.execute(db.insert(Employee.__table__)
+                                          .returning(Employee.employee_id, sort_by_parameter_order=True),
+                                          records).scalars().all()
+        syncEmployeeSkills(db.session, {employee_id: record['skills']
+                                        for employee_id, record in zip(employee_ids, records)})
+        auditChanges(db.session, 'insert', [(employee_id, None, record)
+                                            for employee_id, record in zip(employee_ids, records)])
+    result.rows += len(batch)
+
+
+def importEmployees(csvfile, batch_size=BATCH_SIZE, progress=None):
+    # Streams rows from an open text file, inserting them in batches inside a single transaction.
+    # Nothing is committed unless every row is valid. progress(result) is called after each batch.
+    result = ImportResult()
+    started = perf_counter()
+    reader = csv.reader(csvfile)
+    if next(reader, None) != EMPLOYEE_CSV_HEADER:
+        result.errors.append(HEADER_ERROR)
+        return result
+    seen = set()
+    batch = []
+    try:
+        for idx, row in enumerate(reader):
+            row_num = idx + 2  # Spreadsheets have the first row as 1, and we skip the header
+            result.processed = idx + 1
+            record = parseEmployeeRow(row, row_num, result.errors)
+            if record is None:
+                continue
+            if emailKey(record['email']) in seen:
+                result.errors.append(f'Row {row_num} has email {record["email"]}, which appears earlier in the file')
+                continue
+            seen.add(emailKey(record['email']))
+            batch.append((row_num, record))
+            if len(batch) >= batch_size:
+                _flushBatch(batch, result)
+                batch = []
+                if progress:
+                    progress(result)
+        _flushBatch(batch, result)
+        if result.errors:
+            db.session.rollback()
+        else:
+            markEmployeesChanged()
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    result.seconds = perf_counter() - started
+    return result
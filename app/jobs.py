@@ -0,0 +1,110 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app import db
+from app.models import Job
+from app.importer import importEmployees
+from app.audit import auditAs
+
+# Errors kept on a job for the status endpoint; the rest are only counted
+MAX_JOB_ERRORS = 50
+# Minimum gap between progress writes to the jobs table
+PROGRESS_INTERVAL = 1.0
+
+_executor_lock = Lock()
+_ready_databases = set()  # URLs of jobs databases known to have the jobs table
+_ready_lock = Lock()
+
+
+def silentRemove(filepath):
+    try:
+        os.remove(filepath)
+    except:
+        pass
+
+
+def _ensureJobsTable():
+    # Checked against the current app's jobs bind, so apps with different jobs databases each get the table
+    engine = db.engines['jobs']
+    with _ready_lock:
+        if str(engine.url) not in _ready_databases:
+            Job.__table__.create(engine, checkfirst=True)
+            _ready_databases.add(str(engine.url))
+
+
+def _getExecutor():
+    # Each app has its own pool, sized by its own IMPORT_WORKERS, started on its first import
+    with _executor_lock:
+        executor = current_app.extensions.get('import_executor')
+        if executor is None:
+            executor = current_app.extensions['import_executor'] = ThreadPoolExecutor(
+                max_workers=current_app.config['IMPORT_WORKERS'], thread_name_prefix='import-job')
+    return executor
+
+
+def _updateJob(job_id, **values):
+    # Written straight to the jobs database so it never joins the import's transaction on data.sqlite
+    with db.engines['jobs'].begin() as connection:
+        connection.execute(db.update(Job.__table__).where(Job.job_id == job_id).values(**values))
+
+
+def _countRows(filepath):
+    with open(filepath, 'rb') as f:
+        return max(sum(1 for line in f) - 1, 0)
+
+
+def _runImport(app, job_id, filepath, actor_id):
+    with app.app_context():
+        auditAs(actor_id, 'employee_import')
+        try:
+            _updateJob(job_id, status='running', started_at=datetime.utcnow(), total_rows=_countRows(filepath))
+            last_update = monotonic()
+
+            def progress(result):
+                nonlocal last_update
+                if monotonic() - last_update >= PROGRESS_INTERVAL:
+                    _updateJob(job_id, processed_rows=result.processed, error_count=len(result.errors))
+                    last_update = monotonic()
+
+            with open(filepath, newline='', encoding='utf-8-sig') as csvfile:
+                result = importEmployees(csvfile, progress=progress)
+            if result.errors:
+                message = f'Upload rejected: {len(result.errors)} errors found'
+            else:
+                message = (f'{result.rows} new employees uploaded in {result.seconds:.2f}s '
+                           f'({result.rows_per_second:.0f} rows/sec)')
+            _updateJob(job_id, status='failed' if result.errors else 'done', finished_at=datetime.utcnow(),
+                       processed_rows=result.processed, error_count=len(result.errors),
+                       errors=json.dumps(result.errors[:MAX_JOB_ERRORS]), message=message)
+        except Exception as e:
+            app.logger.exception('Import job %s failed', job_id)
+            _updateJob(job_id, status='failed', finished_at=datetime.utcnow(), message=f'Upload failed: {e}')
+        finally:
+            silentRemove(filepath)
+
+
+def enqueueEmployeeImport(upload, actor_id=None):
+    # Saves the uploaded file and queues it for import, returning the new Job straight away. actor_id is the
+    # user the audit log credits with the imported employees.
+    _ensureJobsTable()
+    executor = _getExecutor()
+    job_id = str(uuid4())
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(f'{job_id}-{upload.filename}'))
+    upload.save(filepath)
+    with db.engines['jobs'].begin() as connection:
+        connection.execute(db.insert(Job.__table__).values(job_id=job_id, kind='employee_import', status='queued',
+                                                           processed_rows=0, error_count=0,
+                                                           created_at=datetime.utcnow()))
+    executor.submit(_runImport, current_app._get_current_object(), job_id, filepath, actor_id)
+    return job_id
+
+
+def getJob(job_id):
+    _ensureJobsTable()
+    return db.session.get(Job, job_id)
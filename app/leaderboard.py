@@ -0,0 +1,127 @@
+from collections import namedtuple
+from threading import Lock
+from flask import current_app
+from app import db
+from app.models import Employee, onEmployeesCommitted
+from app.readmodel import readRows
+from app.cache import dataVersion
+
+TOP_N = 5
+PAGE_SIZE = 20
+
+# A place in the ranking to page from: the employee just before (or after) the page
+Cursor = namedtuple('Cursor', ['skill_points', 'employee_id'])
+LeaderboardEntry = namedtuple('LeaderboardEntry',
+                              ['rank', 'employee_id', 'name', 'current_role', 'skill_points', 'achievement_badge'])
+
+# Columns read for each leaderboard row, in LeaderboardEntry order (after the rank)
+_columns = (Employee.employee_id, Employee.name, Employee.current_role, Employee.skill_points,
+            Employee.achievement_badge)
+_ranked = (Employee.skill_points.desc(), Employee.employee_id)
+
+# Each app keeps its top entries in app.extensions['leaderboard_top'] as (cache.dataVersion() they were read
+# at, entries, whether they are every employee there is)
+_top_lock = Lock()
+
+
+def _entries(rows, first_rank):
+    return [LeaderboardEntry(first_rank + idx, *row) for idx, row in enumerate(rows)]
+
+
+def _covers(cached, version, n):
+    # A shorter list than asked for still answers when it already holds every employee
+    return cached is not None and cached[0] == version and (cached[2] or len(cached[1]) >= n)
+
+
+def topEmployees(n=TOP_N):
+    # The top-N list is shared by every page view until the data version moves on: at once for writes this
+    # process commits, and within CACHE_DEFAULT_TTL for other workers' and commands' writes
+    version = dataVersion()
+    cached = current_app.extensions.get('leaderboard_top')
+    if not _covers(cached, version, n):
+        with _top_lock:
+            # Threads that waited here find the list the first one read
+            cached = current_app.extensions.get('leaderboard_top')
+            if not _covers(cached, version, n):
+                limit = max(n, TOP_N)
+                rows = readRows(db.select(*_columns).order_by(*_ranked).limit(limit)).all()
+                cached = current_app.extensions['leaderboard_top'] = (version, _entries(rows, 1), len(rows) < limit)
+    return cached[1][:n]
+
+
+@onEmployeesCommitted
+def invalidateLeaderboard():
+    current_app.extensions.pop('leaderboard_top', None)
+
+
+def _aheadOf(employee):
+    # Everyone ranked above the employee: more points, or equal points and a lower id
+    return db.or_(Employee.skill_points > employee.skill_points,
+                  db.and_(Employee.skill_points == employee.skill_points,
+                          Employee.employee_id < employee.employee_id))
+
+
+def _behind(employee):
+    return db.or_(Employee.skill_points < employee.skill_points,
+                  db.and_(Employee.skill_points == employee.skill_points,
+                          Employee.employee_id > employee.employee_id))
+
+
+def rankOf(employee):
+    # Two range counts over the (skill_points, employee_id) index rather than a sort of the whole table. They
+    # still step over every index entry ranked above, so a rank costs O(rank): about a millisecond per 100k
+    # employees ahead on SQLite. Kept deliberately instead of a rank column, which a change to one employee's
+    # points would shift for everyone between the old and new score.
+    count = db.func.count()
+    above = db.session.execute(db.select(count).where(Employee.skill_points > employee.skill_points)).scalar()
+    tied = db.session.execute(db.select(count).where(Employee.skill_points == employee.skill_points,
+                                                     Employee.employee_id < employee.employee_id)).scalar()
+    return above + tied + 1
+
+
+def standingOf(employee_id):
+    # The employee's leaderboard columns as a plain row, which is all rankOf() and rankAround() read
+    return readRows(db.select(*_columns).where(Employee.employee_id == employee_id)).first()
+
+
+def rankAround(employee, radius=2):
+    # The employee's own rank plus up to `radius` entries either side, each side read by seeking into the index
+    rank = rankOf(employee)
+    above = readRows(db.select(*_columns).where(_aheadOf(employee))
+                     .order_by(Employee.skill_points, Employee.employee_id.desc()).limit(radius)).all()
+    below = readRows(db.select(*_columns).where(_behind(employee)).order_by(*_ranked).limit(radius)).all()
+    own = (employee.employee_id, employee.name, employee.current_role, employee.skill_points,
+           employee.achievement_badge)
+    rows = list(reversed(above)) + [own] + below
+    return rank, _entries(rows, rank - len(above))
+
+
+def parseCursor(value):
+    # "skill_points,employee_id" from a page link, or None if it isn't one
+    try:
+        points, employee_id = (int(part) for part in (value or '').split(','))
+    except ValueError:
+        return None
+    return Cursor(points, employee_id)
+
+
+def leaderboardPage(after=None, before=None, per_page=PAGE_SIZE):
+    # The page of entries ranked just below `after`, or just above `before`, or the first page. Rows are read
+    # by seeking into the (skill_points, employee_id) index, so a deep page costs what the first one does,
+    # apart from rankOf() numbering it. One row past the page tells whether there is more in that direction.
+    # Returns (entries, has_previous, has_next).
+    if after is None and before is None:
+        entries = topEmployees(per_page + 1)
+        return entries[:per_page], False, len(entries) > per_page
+    if after is not None:
+        rows = readRows(db.select(*_columns).where(_behind(after)).order_by(*_ranked).limit(per_page + 1)).all()
+        more, rows = len(rows) > per_page, rows[:per_page]
+    else:
+        rows = readRows(db.select(*_columns).where(_aheadOf(before))
+                        .order_by(Employee.skill_points, Employee.employee_id.desc()).limit(per_page + 1)).all()
+        more, rows = len(rows) > per_page, list(reversed(rows[:per_page]))
+    if not rows:
+        # Nothing left past the cursor, e.g. after the employees there were removed
+        return leaderboardPage(per_page=per_page)
+    entries = _entries(rows, rankOf(Cursor(rows[0][3], rows[0][0])))
+    return (entries, True, more) if after is not None else (entries, more, True)
@@ -0,0 +1,134 @@
+from threading import Lock
+from time import perf_counter
+from flask import Blueprint, current_app, g, request, has_app_context, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+# Longest statement and parameter text written to the slow query log
+MAX_LOGGED_SQL = 1000
+
+_registry = []
+_registry_lock = Lock()
+
+bp = Blueprint('metrics', __name__)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labelText(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _registry_lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{_labelText(labels)} {value}' for labels, value in self.values.items()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name, self.help, self.buckets = name, help, buckets
+        self.series = {}  # labels -> [count per bucket..., count above the last bucket, sum]
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with _registry_lock:
+            series = self.series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[idx] += 1
+                    break
+            else:
+                series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labelText(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labelText(labels)} {series[-1]}')
+            lines.append(f'{self.name}_count{_labelText(labels)} {cumulative}')
+        return lines
+
+
+request_latency = Histogram('http_request_duration_seconds', 'Time spent handling requests', LATENCY_BUCKETS)
+request_total = Counter('http_requests_total', 'Requests handled')
+request_queries = Histogram('db_queries_per_request', 'SQL statements run per request', QUERY_COUNT_BUCKETS)
+request_db_time = Histogram('db_time_per_request_seconds', 'Time spent in SQL per request', LATENCY_BUCKETS)
+slow_queries = Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_SECONDS')
+
+
+@bp.before_app_request
+def startRequestTimer():
+    g.request_started = perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def startQueryTimer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def recordQuery(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info['query_started'].pop()
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+    if has_app_context() and elapsed >= current_app.config['SLOW_QUERY_SECONDS']:
+        endpoint = request.endpoint if has_request_context() else None
+        slow_queries.inc(endpoint=endpoint or 'none')
+        current_app.logger.warning('Slow query (%.3fs, endpoint %s): %s; parameters: %s', elapsed, endpoint,
+                                   statement[:MAX_LOGGED_SQL], repr(parameters)[:MAX_LOGGED_SQL])
+
+
+@event.listens_for(Engine, 'handle_error')
+def discardQueryTimer(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+@bp.after_app_request
+def recordRequest(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = perf_counter() - g.request_started
+    endpoint = request.endpoint or 'none'
+    request_latency.observe(elapsed, endpoint=endpoint)
+    request_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    request_queries.observe(g.db_queries, endpoint=endpoint)
+    request_db_time.observe(g.db_time, endpoint=endpoint)
+    response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+    response.headers.add('Server-Timing', f'db;dur={g.db_time * 1000:.1f};desc="{g.db_queries} queries"')
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition format
+    with _registry_lock:
+        lines = [line for metric in _registry for line in metric.render()]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,221 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
+from app import db
+from app.models import Employee, SchemaMigration, badgeFor, badgeCase, markEmployeesChanged
+from app.analytics import triggersInstalled, ensureAnalytics, analyticsDrift, rebuildAnalytics
+from app.audit import auditAs, auditChanges
+
+# Employees each backfill batch reads and writes, in one short transaction; the app keeps serving between
+# batches, so a backfill over a million rows never holds the write lock for more than a moment
+BACKFILL_BATCH_SIZE = 1000
+
+# schema() makes an idempotent schema change and backfill(session, first_id, last_id) fixes the employees
+# with ids in that range, returning how many rows it changed. Either may be None. Versions only ever grow;
+# a released migration is never edited, a new one is added instead.
+Migration = namedtuple('Migration', ['version', 'name', 'description', 'schema', 'backfill'])
+VerifyResult = namedtuple('VerifyResult', ['employees', 'badge_problems', 'repaired', 'analytics_drift',
+                                           'analytics_rebuilt'])
+
+
+def createIndexOnline(index):
+    # Builds a missing index without taking its table offline. PostgreSQL builds it CONCURRENTLY, which has
+    # to run outside a transaction, and MySQL's InnoDB builds indexes in place while writes carry on. SQLite
+    # has no online build: readers carry on under WAL but writers wait for it, so SQLITE_BUSY_TIMEOUT_MS has
+    # to cover the build, roughly a second per million rows.
+    engine = db.engine
+    ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+    if engine.dialect.name == 'postgresql':
+        ddl = re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl)
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql(ddl)
+    else:
+        with engine.begin() as connection:
+            connection.exec_driver_sql(ddl)
+
+
+def _indexNames(inspector, table_name):
+    # SQLAlchemy doesn't reflect SQLite's expression indexes, such as lower(email), so they are listed by name
+    if inspector.dialect.name == 'sqlite':
+        with db.engine.connect() as connection:
+            return set(connection.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                                  "AND tbl_name = :table"), dict(table=table_name)).scalars())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def createMissingIndexes():
+    # Indexes declared on the main database's models but missing from their existing tables, built online
+    # one at a time; returns their names
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.info.get('bind_key') is None and table.name in tables:
+            present = _indexNames(inspector, table.name)
+            for index in table.indexes:
+                if index.name not in present:
+                    createIndexOnline(index)
+                    created.append(index.name)
+    return created
+
+
+def createMissingSchema():
+    # New tables are created whole (empty, so their indexes cost nothing); existing ones get missing indexes.
+    # An employee_summary table added to an existing employees table has no triggers yet and counts nobody,
+    # so ensureAnalytics() adds the triggers and counts everyone.
+    db.create_all(bind_key=None)
+    createMissingIndexes()
+    ensureAnalytics()
+
+
+def _badgeProblems(session, first_id, last_id):
+    # (employee_id, skill_points, achievement_badge) of the employees in the range whose points are missing
+    # or whose badge isn't the one their points earn
+    table = Employee.__table__
+    return session.connection().execute(
+        db.select(table.c.employee_id, table.c.skill_points, table.c.achievement_badge)
+        .where(table.c.employee_id.between(first_id, last_id))
+        .where(db.or_(table.c.skill_points.is_(None), table.c.achievement_badge.is_(None),
+                      table.c.achievement_badge != badgeCase(table.c.skill_points)))).all()
+
+
+def repairBadges(session, first_id, last_id):
+    rows = _badgeProblems(session, first_id, last_id)
+    if rows:
+        table = Employee.__table__
+        session.execute(db.update(table).where(table.c.employee_id == db.bindparam('e_id'))
+                        .values(skill_points=db.bindparam('new_points'), achievement_badge=db.bindparam('new_badge')),
+                        [dict(e_id=employee_id, new_points=points or 0, new_badge=badgeFor(points))
+                         for employee_id, points, badge in rows])
+        auditChanges(session, 'update', [(employee_id, dict(skill_points=points, achievement_badge=badge),
+                                          dict(skill_points=points or 0, achievement_badge=badgeFor(points)))
+                                         for employee_id, points, badge in rows])
+        markEmployeesChanged(session)
+    return len(rows)
+
+
+def roundExperience(session, first_id, last_id):
+    # The column declares one decimal place, but SQLite keeps whatever float it was given
+    table = Employee.__table__
+    rows = session.connection().execute(
+        db.select(table.c.employee_id, db.cast(table.c.experience, db.Float))
+        .where(table.c.employee_id.between(first_id, last_id))
+        .where(table.c.experience != db.func.round(table.c.experience, 1))).all()
+    changes = [(employee_id, experience, round(experience, 1)) for employee_id, experience in rows
+               if round(experience, 1) != experience]
+    if changes:
+        session.execute(db.update(table).where(table.c.employee_id == db.bindparam('e_id'))
+                        .values(experience=db.bindparam('new_experience', type_=db.Float)),
+                        [dict(e_id=employee_id, new_experience=new) for employee_id, old, new in changes])
+        auditChanges(session, 'update', [(employee_id, dict(experience=old), dict(experience=new))
+                                         for employee_id, old, new in changes])
+        markEmployeesChanged(session)
+    return len(changes)
+
+
+MIGRATIONS = [
+    Migration(1, 'baseline', 'Create missing tables, and build missing indexes online', createMissingSchema, None),
+    Migration(2, 'repair_badges', 'Give employees without skill points 0, and recompute badges that disagree '
+                                  'with their points', None, repairBadges),
+    Migration(3, 'round_experience', 'Round experience to one decimal place', None, roundExperience),
+    Migration(4, 'email_lower_indexes', 'Build the lower(email) indexes for case-insensitive email lookups online',
+              createMissingIndexes, None),
+]
+
+
+def _employeeBatches(batch_size, after=0):
+    # Lists of up to batch_size consecutive employee ids above `after`, read one batch ahead of the caller,
+    # so ids inserted meanwhile are still reached and the caller can commit between batches
+    table = Employee.__table__
+    while True:
+        ids = db.session.connection().execute(db.select(table.c.employee_id).where(table.c.employee_id > after)
+                                              .order_by(table.c.employee_id).limit(batch_size)).scalars().all()
+        if not ids:
+            return
+        yield ids
+        after = ids[-1]
+
+
+def _employeesAfter(after):
+    table = Employee.__table__
+    return db.session.execute(db.select(db.func.count()).select_from(table)
+                              .where(table.c.employee_id > after)).scalar()
+
+
+def migrationStates():
+    # [(Migration, its SchemaMigration row or None if never started)] in version order
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    states = {state.version: state for state in db.session.execute(db.select(SchemaMigration)).scalars()}
+    return [(migration, states.get(migration.version)) for migration in MIGRATIONS]
+
+
+def runMigrations(batch_size=BACKFILL_BATCH_SIZE, progress=None):
+    # Applies every unfinished migration in version order, resuming a backfill after the last batch it
+    # committed. progress(state, total) is called after each batch. Returns the migrations applied.
+    applied = []
+    auditAs(source='migrate')
+    for migration, state in migrationStates():
+        if state is not None and state.finished_at is not None:
+            continue
+        if state is None:
+            state = SchemaMigration(version=migration.version, name=migration.name, started_at=datetime.utcnow(),
+                                    rows_done=0, rows_changed=0)
+            db.session.add(state)
+            db.session.commit()
+        if migration.schema is not None:
+            migration.schema()
+        if migration.backfill is not None:
+            total = state.rows_done + _employeesAfter(state.resume_after or 0)
+            for ids in _employeeBatches(batch_size, after=state.resume_after or 0):
+                state.rows_changed += migration.backfill(db.session, ids[0], ids[-1])
+                state.rows_done += len(ids)
+                state.resume_after = ids[-1]
+                db.session.commit()  # The batch and the resume point together
+                if progress:
+                    progress(state, total)
+        state.finished_at = datetime.utcnow()
+        db.session.commit()
+        applied.append(migration)
+    return applied
+
+
+def repairAllBadges(batch_size=BACKFILL_BATCH_SIZE, progress=None):
+    # Gives every employee skill points and the badge they earn, each batch in its own transaction with its
+    # changes audited. progress(employees checked, rows repaired) is called after each batch. Returns
+    # (employees checked, rows repaired).
+    employees = repaired = 0
+    for ids in _employeeBatches(batch_size):
+        repaired += repairBadges(db.session, ids[0], ids[-1])
+        db.session.commit()
+        employees += len(ids)
+        if progress:
+            progress(employees, repaired)
+    return employees, repaired
+
+
+def verifyEmployees(repair=False, batch_size=BACKFILL_BATCH_SIZE, progress=None):
+    # Checks, a batch at a time, that every employee has skill points and the badge they earn, and that the
+    # analytics totals match the table. With repair=True fixes what it finds, each batch in its own
+    # transaction. progress(employees checked, problems found) is called after each batch.
+    auditAs(source='verify-employees')
+    employees = problems = repaired = 0
+    if repair:
+        employees, repaired = repairAllBadges(batch_size, progress)
+        problems = repaired
+    else:
+        for ids in _employeeBatches(batch_size):
+            problems += len(_badgeProblems(db.session, ids[0], ids[-1]))
+            employees += len(ids)
+            if progress:
+                progress(employees, problems)
+    db.session.rollback()  # End the read transaction before counting the totals afresh
+    # Without the triggers (other databases, or SQLite before the first migration) the totals are recounted
+    # when they are next read, so they are expected to lag
+    drift = len(analyticsDrift()) if triggersInstalled() else 0
+    db.session.rollback()
+    if drift and repair:
+        rebuildAnalytics()
+    return VerifyResult(employees=employees, badge_problems=problems, repaired=repaired, analytics_drift=drift,
+                        analytics_rebuilt=bool(drift and repair))
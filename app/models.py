@@ -1,8 +1,25 @@
 from app import db, login
+import json
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime
+from itertools import chain
+from threading import Lock
+from time import monotonic
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
 
+@lru_cache(maxsize=8)
+def storedHashMethod(method):
+    # The method as werkzeug writes it into hashes: short forms gain their defaults, e.g. 'scrypt' is stored
+    # as 'scrypt:32768:8:1' and 'pbkdf2' as 'pbkdf2:sha256:600000'. Found by hashing once per method.
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     user_id = db.Column(db.Integer, primary_key=True, unique=True, nullable=False)
@@ -10,12 +27,25 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(64), nullable=False, unique=True, index=True)
     password_hash = db.Column(db.String(256), nullable=False)
 
+    # Addresses are compared ignoring case (see app.emails.emailKey), which this index serves
+    __table_args__ = (
+        db.Index('ix_users_email_lower', db.func.lower(email)),
+    )
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password, salt_length=32)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'],
+                                                    salt_length=current_app.config['PASSWORD_SALT_LENGTH'])
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        # True when the stored hash was made with other settings than the configured ones,
+        # i.e. "method$salt$hash" has a different method or salt length
+        method, salt, hashval = self.password_hash.split('$', 2)
+        return (method != storedHashMethod(current_app.config['PASSWORD_HASH_METHOD'])
+                or len(salt) != current_app.config['PASSWORD_SALT_LENGTH'])
+
     # Since we named our primary key "user_id", instead of "id", we have to override the
     # get_id() from the UserMixin to return the id, and it has to be returned as a string
     def get_id(self):
@@ -25,9 +55,102 @@ class User(UserMixin, db.Model):
         return f"user(id='{self.user_id}', '{self.username}', '{self.email}')"
 
 
+USER_CACHE_SIZE = 10000
+
+
+class UserCache:
+    # Users loaded for recent requests, as {user_id: (expiry time, detached User)}, least recently used
+    # first. Each app has its own, since the same user_id is a different user in another app's database.
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or entry[0] <= monotonic():
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, user, ttl):
+        with self.lock:
+            self.entries[user_id] = (monotonic() + ttl, user)
+            self.entries.move_to_end(user_id)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def forget(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self.entries.pop(user_id, None)
+
+
+def initUserCache(app):
+    app.extensions['user_cache'] = UserCache(USER_CACHE_SIZE)
+
+
+def forgetUser(user_id):
+    current_app.extensions['user_cache'].forget([int(user_id)])
+
+
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    # Serves the user from a short-lived cache so authenticated requests skip the users lookup
+    user_id = int(id)
+    cache = current_app.extensions['user_cache']
+    cached = cache.get(user_id)
+    if cached is not None:
+        # merge(load=False) attaches a copy of the cached user to this request's session without a query
+        return db.session.merge(cached, load=False)
+    user = db.session.get(User, user_id)
+    ttl = current_app.config['USER_CACHE_TTL']
+    if user is not None and ttl > 0:
+        # The password hash is left out, it is loaded on demand if a request needs it
+        snapshot = User(user_id=user.user_id, username=user.username, email=user.email)
+        make_transient_to_detached(snapshot)
+        cache.set(user_id, snapshot, ttl)
+    return user
+
+
+# A committed change to a user drops them from the committing app's cache, so the next request reloads them
+@event.listens_for(Session, 'after_flush')
+def noteUserWrites(session, flush_context):
+    user_ids = {obj.user_id for obj in chain(session.dirty, session.deleted) if isinstance(obj, User)}
+    if user_ids:
+        session.info.setdefault('users_changed', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def forgetCommittedUsers(session):
+    user_ids = session.info.pop('users_changed', None)
+    if user_ids and has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].forget(user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discardUserWrites(session):
+    session.info.pop('users_changed', None)
+
+
+# Achievement badge tiers, highest first: (minimum skill points, badge)
+BADGE_TIERS = [(21, 'Gold'), (10, 'Silver'), (5, 'Bronze')]
+DEFAULT_BADGE = 'Beginner'
+
+
+def badgeFor(skill_points):
+    points = skill_points or 0
+    for minimum, badge in BADGE_TIERS:
+        if points >= minimum:
+            return badge
+    return DEFAULT_BADGE
+
+
+def badgeCase(skill_points_column):
+    # The same tiers as badgeFor(), expressed as a SQL CASE for set-based updates
+    points = db.func.coalesce(skill_points_column, 0)
+    return db.case(*[(points >= minimum, badge) for minimum, badge in BADGE_TIERS], else_=DEFAULT_BADGE)
 
 
 class Employee(db.Model):
@@ -36,22 +159,266 @@ class Employee(db.Model):
     name = db.Column(db.String(64), nullable=False, index=True)
     email = db.Column(db.String(64), nullable=False, unique=True, index=True)
     date_of_joining = db.Column(db.Date, nullable=False)
-    current_role = db.Column(db.String(64), nullable=False)
+    current_role = db.Column(db.String(64), nullable=False, index=True)
     past_roles = db.Column(db.Text, nullable=True)
     skills = db.Column(db.Text, nullable=False)
-    experience = db.Column(db.Numeric(precision=4, scale=1), nullable=False)  # Allows up to 999.9 years of experience
+    experience = db.Column(db.Numeric(precision=4, scale=1), nullable=False, index=True)  # Allows up to 999.9 years of experience
     educational_background = db.Column(db.Text, nullable=False)
     skill_points = db.Column(db.Integer, nullable=True, default=0)
-    achievement_badge = db.Column(db.String(64), nullable=True)
+    achievement_badge = db.Column(db.String(64), nullable=True, index=True)
+
+    # Serves the leaderboard ordering (highest points first, ties broken by id) straight from the index, and
+    # the case-insensitive email lookups of app.emails.emailsInUse
+    __table_args__ = (
+        db.Index('ix_employees_skill_points_employee_id', skill_points.desc(), employee_id),
+        db.Index('ix_employees_email_lower', db.func.lower(email)),
+    )
 
     # loans = db.relationship('Loan', backref='employee', lazy='dynamic')  # Adjust if necessary
 
+    def to_dict(self):
+        return dict(employee_id=self.employee_id, name=self.name, email=self.email,
+                    date_of_joining=self.date_of_joining.isoformat(), current_role=self.current_role,
+                    past_roles=self.past_roles, skills=self.skills, experience=float(self.experience),
+                    educational_background=self.educational_background, skill_points=self.skill_points,
+                    achievement_badge=self.achievement_badge)
+
     def __repr__(self):
         return (f"Employee(id='{self.employee_id}', name='{self.name}', date_of_joining='{self.date_of_joining}', "
                 f"current_role='{self.current_role}', past_roles='{self.past_roles}', skills='{self.skills}', "
                 f"experience='{self.experience}', educational_background='{self.educational_background}', "
                 f"skill_points='{self.skill_points}', achievement_badge='{self.achievement_badge}')")
 
+
+# Keep the badge in step with skill_points whenever an Employee is written through the ORM,
+# so pages never have to recompute it on read
+@event.listens_for(Employee, 'before_insert')
+@event.listens_for(Employee, 'before_update')
+def setAchievementBadge(mapper, connection, employee):
+    if employee.skill_points is None:
+        employee.skill_points = 0
+    employee.achievement_badge = badgeFor(employee.skill_points)
+
+
+# Callbacks run after a commit that wrote Employee rows, used to drop derived data such as cached leaderboards
+employee_commit_listeners = []
+
+
+def onEmployeesCommitted(func):
+    employee_commit_listeners.append(func)
+    return func
+
+
+def markEmployeesChanged(session=None):
+    # For writes that bypass the unit of work (Core UPDATE/INSERT statements)
+    (session or db.session).info['employees_changed'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def noteEmployeeWrites(session, flush_context):
+    if any(isinstance(obj, Employee) for obj in chain(session.new, session.dirty, session.deleted)):
+        markEmployeesChanged(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def notifyEmployeesCommitted(session):
+    if session.info.pop('employees_changed', False):
+        for listener in employee_commit_listeners:
+            listener()
+
+
+@event.listens_for(Session, 'after_rollback')
+def discardEmployeeWrites(session):
+    session.info.pop('employees_changed', None)
+
+
+class Skill(db.Model):
+    __tablename__ = 'skills'
+    skill_id = db.Column(db.Integer, primary_key=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)  # Lowercased, used for matching
+    display_name = db.Column(db.String(100), nullable=False)  # As first written by an employee
+
+    def __repr__(self):
+        return f"Skill(id='{self.skill_id}', name='{self.name}')"
+
+
+class EmployeeSkill(db.Model):
+    __tablename__ = 'employee_skills'
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.employee_id', ondelete='CASCADE'),
+                            primary_key=True, nullable=False)
+    skill_id = db.Column(db.Integer, db.ForeignKey('skills.skill_id', ondelete='CASCADE'),
+                         primary_key=True, nullable=False)
+    listed = db.Column(db.Boolean, nullable=False, default=True)  # Named in the employee's profile skills
+    self_rating = db.Column(db.Integer, nullable=True)
+    supervisor_rating = db.Column(db.Integer, nullable=True)
+
+    # The primary key answers "which skills does this employee hold"; this index is the inverted
+    # direction, "which employees hold this skill", already sorted for intersections
+    __table_args__ = (
+        db.Index('ix_employee_skills_skill_id_employee_id', 'skill_id', 'employee_id'),
+    )
+
+    def __repr__(self):
+        return (f"EmployeeSkill(employee_id='{self.employee_id}', skill_id='{self.skill_id}', listed='{self.listed}', "
+                f"self_rating='{self.self_rating}', supervisor_rating='{self.supervisor_rating}')")
+
+
+class Assessment(db.Model):
+    __tablename__ = 'assessments'
+    assessment_id = db.Column(db.Integer, primary_key=True, nullable=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.employee_id', ondelete='CASCADE'), nullable=False)
+    assessor_id = db.Column(db.Integer, nullable=True)  # user_id of whoever submitted it
+    self_assessed_skills = db.Column(db.Text, nullable=True)
+    self_rating = db.Column(db.Integer, nullable=True)
+    new_competencies = db.Column(db.Text, nullable=True)
+    supervisor_assessed_skills = db.Column(db.Text, nullable=True)
+    supervisor_rating = db.Column(db.Integer, nullable=True)
+    future_skills = db.Column(db.Text, nullable=True)
+    points_awarded = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Serves an employee's assessment history, newest first, without touching other employees' rows
+    __table_args__ = (
+        db.Index('ix_assessments_employee_id_created_at', 'employee_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return dict(assessment_id=self.assessment_id, employee_id=self.employee_id, assessor_id=self.assessor_id,
+                    self_assessed_skills=self.self_assessed_skills, self_rating=self.self_rating,
+                    new_competencies=self.new_competencies, supervisor_assessed_skills=self.supervisor_assessed_skills,
+                    supervisor_rating=self.supervisor_rating, future_skills=self.future_skills,
+                    points_awarded=self.points_awarded, created_at=self.created_at.isoformat())
+
+    def __repr__(self):
+        return (f"Assessment(id='{self.assessment_id}', employee_id='{self.employee_id}', "
+                f"self_rating='{self.self_rating}', supervisor_rating='{self.supervisor_rating}')")
+
+
+class Goal(db.Model):
+    __tablename__ = 'goals'
+    goal_id = db.Column(db.Integer, primary_key=True, nullable=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.employee_id', ondelete='CASCADE'), nullable=False)
+    goals = db.Column(db.Text, nullable=False)
+    kpis = db.Column(db.Text, nullable=False)
+    feedback = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_goals_employee_id_created_at', 'employee_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return dict(goal_id=self.goal_id, employee_id=self.employee_id, goals=self.goals, kpis=self.kpis,
+                    feedback=self.feedback, created_at=self.created_at.isoformat())
+
+    def __repr__(self):
+        return f"Goal(id='{self.goal_id}', employee_id='{self.employee_id}', created_at='{self.created_at}')"
+
+
+class DevelopmentPlan(db.Model):
+    # The last plan generated for each employee, kept until something it was generated from changes
+    __tablename__ = 'development_plans'
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.employee_id', ondelete='CASCADE'),
+                            primary_key=True, nullable=False)
+    plan = db.Column(db.Text, nullable=False)
+    generated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"DevelopmentPlan(employee_id='{self.employee_id}', generated_at='{self.generated_at}')"
+
+
+class EmployeeSummary(db.Model):
+    # Running totals of employees per role, badge and skill points, kept current by triggers on employees
+    # (see app.analytics), so the analytics dashboard reads a few rows however many employees there are
+    __tablename__ = 'employee_summary'
+    dimension = db.Column(db.String(16), primary_key=True, nullable=False)  # role, badge or points
+    value = db.Column(db.String(64), primary_key=True, nullable=False)
+    headcount = db.Column(db.Integer, nullable=False, default=0)
+    experience_tenths = db.Column(db.Integer, nullable=False, default=0)  # Total experience, in tenths of a year
+
+    def __repr__(self):
+        return f"EmployeeSummary(dimension='{self.dimension}', value='{self.value}', headcount='{self.headcount}')"
+
+
+class SchemaMigration(db.Model):
+    # One row per migration "flask migrate" has started. A backfill stores the last employee_id it finished
+    # in the same transaction as each batch, so an interrupted run picks up exactly where it stopped.
+    __tablename__ = 'schema_migrations'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False, nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)  # None while it still has work left
+    resume_after = db.Column(db.Integer, nullable=True)  # Last employee_id a backfill has done
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    rows_changed = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (f"SchemaMigration(version='{self.version}', name='{self.name}', finished_at='{self.finished_at}', "
+                f"resume_after='{self.resume_after}')")
+
+
+class AuditEntry(db.Model):
+    # One committed change to an employees row. The log lives in a database of its own and is only ever
+    # appended to, in batches after the change has committed, so it never joins or holds up the change.
+    __bind_key__ = 'audit'
+    __tablename__ = 'audit_log'
+    # Ids only ever increase, in the order the changes were logged, so consumers resume after the last one seen
+    entry_id = db.Column(db.Integer, primary_key=True, nullable=False)
+    recorded_at = db.Column(db.DateTime, nullable=False)  # When the change was committed
+    actor_id = db.Column(db.Integer, nullable=True)  # user_id of whoever made it, None for commands
+    source = db.Column(db.String(64), nullable=True)  # The endpoint, job or command that made it
+    operation = db.Column(db.String(8), nullable=False)  # insert, update or delete
+    employee_id = db.Column(db.Integer, nullable=False, index=True)
+    before = db.Column(db.Text, nullable=True)  # JSON of the changed fields' old values
+    after = db.Column(db.Text, nullable=True)  # JSON of their new values
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    def to_dict(self):
+        return dict(entry_id=self.entry_id, recorded_at=self.recorded_at.isoformat(), actor_id=self.actor_id,
+                    source=self.source, operation=self.operation, employee_id=self.employee_id,
+                    before=json.loads(self.before) if self.before else None,
+                    after=json.loads(self.after) if self.after else None)
+
+    def __repr__(self):
+        return (f"AuditEntry(id='{self.entry_id}', operation='{self.operation}', employee_id='{self.employee_id}', "
+                f"actor_id='{self.actor_id}')")
+
+
+class Job(db.Model):
+    __bind_key__ = 'jobs'
+    __tablename__ = 'jobs'
+    job_id = db.Column(db.String(36), primary_key=True, nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    total_rows = db.Column(db.Integer, nullable=True)  # Estimated from the file's line count
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text, nullable=True)  # JSON list of the first errors found
+    message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def eta_seconds(self):
+        if self.status != 'running' or not self.started_at or not self.processed_rows or not self.total_rows:
+            return None
+        elapsed = (datetime.utcnow() - self.started_at).total_seconds()
+        remaining = max(self.total_rows - self.processed_rows, 0)
+        return round(elapsed / self.processed_rows * remaining, 1)
+
+    def to_dict(self):
+        return dict(job_id=self.job_id, kind=self.kind, status=self.status, total_rows=self.total_rows,
+                    processed_rows=self.processed_rows, error_count=self.error_count,
+                    errors=json.loads(self.errors) if self.errors else [], message=self.message,
+                    eta_seconds=self.eta_seconds(), created_at=self.created_at.isoformat(),
+                    started_at=self.started_at.isoformat() if self.started_at else None,
+                    finished_at=self.finished_at.isoformat() if self.finished_at else None)
+
+    def __repr__(self):
+        return f"Job(id='{self.job_id}', kind='{self.kind}', status='{self.status}', processed_rows='{self.processed_rows}')"
+
+
 # class Loan(db.Model):
 #     __tablename__ = 'loans'
 #     loan_id = db.Column(db.Integer, primary_key=True, unique=True, nullable=False)
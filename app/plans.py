@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+from jinja2 import Environment, FileSystemLoader
+from sqlalchemy import event, inspect
+from flask import current_app
+from sqlalchemy.orm import Session
+from app import db, basedir
+from app.models import Employee, Skill, EmployeeSkill, Assessment, DevelopmentPlan
+from app.skills import parseSkills, chunks
+
+# Skills suggested per goal, and how many of the role's most common skills are considered for gaps
+SKILLS_PER_GOAL = 3
+ROLE_SKILLS_CONSIDERED = 50
+# A skill rated at or below this, by the supervisor or else by the employee, needs strengthening
+WEAK_RATING = 5
+# Minimum years of experience for each career stage, most experienced first
+CAREER_STAGES = [(10, 'strategy'), (5, 'leadership'), (2, 'expertise'), (0, 'foundations')]
+# Employees per batch, both for the queries gathering plan inputs and for the work sent to each process
+PLAN_BATCH_SIZE = 500
+# Profile fields a plan is generated from; changing any of them discards the employee's stored plan
+PLAN_FIELDS = ('name', 'current_role', 'experience', 'skills')
+
+# Every plan template is compiled here, once, rather than on each render
+_environment = Environment(loader=FileSystemLoader(os.path.join(basedir, 'templates', 'plans')),
+                           trim_blocks=True, lstrip_blocks=True, keep_trailing_newline=True, auto_reload=False)
+_templates = {name: _environment.get_template(name) for name in _environment.list_templates()}
+
+
+def careerStage(experience):
+    for minimum, stage in CAREER_STAGES:
+        if experience >= minimum:
+            return stage
+    return CAREER_STAGES[-1][1]
+
+
+def planInputs(employee_ids, role_skills=None):
+    # What each employee's plan is built from, gathered with a handful of queries for the whole batch.
+    # role_skills is {role: roleSkills(role)}, filled in for any role it is missing.
+    employees = db.session.execute(db.select(Employee.employee_id, Employee.name, Employee.current_role,
+                                             Employee.experience)
+                                   .where(Employee.employee_id.in_(employee_ids))).all()
+    held = {employee.employee_id: set() for employee in employees}
+    weak = {employee.employee_id: [] for employee in employees}
+    for row in db.session.execute(db.select(EmployeeSkill.employee_id, Skill.display_name,
+                                            EmployeeSkill.self_rating, EmployeeSkill.supervisor_rating)
+                                  .join(Skill, Skill.skill_id == EmployeeSkill.skill_id)
+                                  .where(EmployeeSkill.employee_id.in_(employee_ids))
+                                  .order_by(EmployeeSkill.employee_id, Skill.display_name)):
+        held[row.employee_id].add(row.display_name.lower())
+        rating = row.supervisor_rating if row.supervisor_rating is not None else row.self_rating
+        if rating is not None and rating <= WEAK_RATING:
+            weak[row.employee_id].append(row.display_name)
+    latest = (db.select(db.func.max(Assessment.assessment_id))
+              .where(Assessment.employee_id.in_(employee_ids), Assessment.future_skills.is_not(None))
+              .group_by(Assessment.employee_id))
+    suggested = dict(db.session.execute(db.select(Assessment.employee_id, Assessment.future_skills)
+                                        .where(Assessment.assessment_id.in_(latest))).all())
+    role_skills = {} if role_skills is None else role_skills
+    for role in {employee.current_role for employee in employees} - set(role_skills):
+        role_skills[role] = roleSkills(role)
+    inputs = {}
+    for employee in employees:
+        owned = held[employee.employee_id]
+        future = parseSkills(suggested.get(employee.employee_id))
+        inputs[employee.employee_id] = dict(
+            employee=employee,
+            gaps=[skill for skill in role_skills[employee.current_role] if skill.lower() not in owned][:SKILLS_PER_GOAL],
+            weak=weak[employee.employee_id][:SKILLS_PER_GOAL],
+            suggested=[display for name, display in future.items() if name not in owned][:SKILLS_PER_GOAL])
+    return inputs
+
+
+def roleSkills(role):
+    # The role's most widely held skills, most common first. Skills the employee holds add nothing to the
+    # count of skills they lack, so the gaps taken from this match skillGaps() for every member of the role.
+    headcount = db.func.count(EmployeeSkill.employee_id)
+    return db.session.execute(db.select(Skill.display_name)
+                              .join(EmployeeSkill, EmployeeSkill.skill_id == Skill.skill_id)
+                              .join(Employee, Employee.employee_id == EmployeeSkill.employee_id)
+                              .where(Employee.current_role == role)
+                              .group_by(Skill.skill_id).order_by(headcount.desc(), Skill.display_name)
+                              .limit(ROLE_SKILLS_CONSIDERED)).scalars().all()
+
+
+def renderPlan(inputs):
+    # Each rule that applies to the employee adds a goal, in this order
+    sections = []
+    if inputs['gaps']:
+        sections.append(dict(template='skill_gaps.txt', skills=inputs['gaps']))
+    if inputs['weak']:
+        sections.append(dict(template='strengthen.txt', skills=inputs['weak']))
+    if inputs['suggested']:
+        sections.append(dict(template='explore.txt', skills=inputs['suggested']))
+    experience = float(inputs['employee'].experience)
+    sections.append(dict(template='career_stage.txt', stage=careerStage(experience), experience=experience))
+    return _templates['plan.txt'].render(employee=inputs['employee'], sections=sections).strip() + '\n'
+
+
+def generatePlans(employee_ids, role_skills=None):
+    # {employee_id: plan text}, rendered without storing anything
+    return {employee_id: renderPlan(inputs) for employee_id, inputs in planInputs(employee_ids, role_skills).items()}
+
+
+def storePlans(session, plans):
+    table = DevelopmentPlan.__table__
+    session.execute(db.delete(table).where(table.c.employee_id.in_(list(plans))))
+    session.execute(db.insert(table), [dict(employee_id=employee_id, plan=plan) for employee_id, plan in plans.items()])
+
+
+def developmentPlanFor(employee_id):
+    # The stored plan, generating and storing it first if there isn't one
+    stored = db.session.get(DevelopmentPlan, employee_id)
+    if stored is None:
+        plans = generatePlans([employee_id])
+        if not plans:
+            return None
+        storePlans(db.session, plans)
+        db.session.commit()
+        stored = db.session.get(DevelopmentPlan, employee_id)
+    return stored
+
+
+def forgetPlans(session, employee_ids):
+    # For writes that change plan inputs without going through the ORM, such as recorded assessments
+    for chunk in chunks(set(employee_ids)):
+        session.execute(db.delete(DevelopmentPlan).where(DevelopmentPlan.employee_id.in_(chunk)))
+
+
+@event.listens_for(Session, 'after_flush')
+def forgetChangedPlans(session, flush_context):
+    changed = [obj.employee_id for obj in chain(session.dirty, session.deleted) if isinstance(obj, Employee)
+               and (obj in session.deleted or any(inspect(obj).attrs[field].history.has_changes()
+                                                  for field in PLAN_FIELDS))]
+    if changed:
+        forgetPlans(session, changed)
+
+
+# The app pool workers run in: inherited from the parent when forked, otherwise built from the environment
+_worker_app = None
+
+
+def _startWorker():
+    # Forked workers must open connections of their own rather than share the parent's pooled ones
+    global _worker_app
+    if _worker_app is None:
+        from app import create_app
+        _worker_app = create_app()
+    with _worker_app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def _generateBatch(employee_ids, role_skills):
+    with _worker_app.app_context():
+        try:
+            return generatePlans(employee_ids, role_skills)
+        finally:
+            db.session.remove()
+
+
+def _employeeIdBatches(batch_size):
+    last_id = 0
+    while True:
+        ids = db.session.execute(db.select(Employee.employee_id).where(Employee.employee_id > last_id)
+                                 .order_by(Employee.employee_id).limit(batch_size)).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def regenerateAllPlans(workers=None, batch_size=PLAN_BATCH_SIZE, progress=None):
+    # Renders every employee's plan across a pool of processes; this process stores each batch as it
+    # arrives, so the workers only ever read. progress(done) is called after each stored batch.
+    global _worker_app
+    _worker_app = current_app._get_current_object()
+    done = 0
+    # Ranked once here rather than again in every batch
+    roles = db.session.execute(db.select(Employee.current_role).distinct()).scalars()
+    role_skills = {role: roleSkills(role) for role in roles}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_startWorker) as pool:
+        futures = [pool.submit(_generateBatch, ids, role_skills) for ids in _employeeIdBatches(batch_size)]
+        for future in as_completed(futures):
+            plans = future.result()
+            if plans:
+                storePlans(db.session, plans)
+                db.session.commit()
+            done += len(plans)
+            if progress:
+                progress(done)
+    return done
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from functools import wraps
+from math import ceil
+from threading import Lock
+from time import monotonic, time
+from flask import current_app, request, render_template, make_response
+from app.metrics import Counter
+
+rate_limit_checks = Counter('rate_limit_checks_total', 'Requests checked against a rate limit')
+rate_limited = Counter('rate_limited_total', 'Requests rejected with 429 by a rate limit')
+
+
+class MemoryBuckets:
+    # Token buckets kept in this process, least recently used first. Once max_keys clients are tracked the
+    # idlest one's bucket is dropped, which only ever lets that client start again with a full bucket.
+    # Each worker process limits on its own, so N workers allow up to N times the configured rate.
+    shared = False
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # {key: [tokens, last refill time]}
+        self.lock = Lock()
+
+    def take(self, key, capacity, rate):
+        # Seconds until a token is available, or 0 after taking one
+        now = monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [capacity, now]
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+
+# Refill and take in one step on the server, so concurrent workers can't both spend the last token
+TAKE_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[1])
+local last = tonumber(redis.call('HGET', KEYS[1], 'last') or ARGV[3])
+local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+tokens = math.min(capacity, tokens + math.max(now - last, 0) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'last', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    # Token buckets shared by every worker, in Redis or any server speaking its protocol. Needs the optional
+    # redis package. Buckets expire once they would have refilled, so idle clients cost nothing.
+    shared = True
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATELIMIT_BACKEND=redis needs the redis package: pip install redis')
+        self.take_script = redis.Redis.from_url(url).register_script(TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self.take_script(keys=['ratelimit:' + key], args=[capacity, rate, time()]))
+
+
+def initRateLimits(app):
+    if app.config['RATELIMIT_BACKEND'] == 'redis':
+        app.extensions['rate_limits'] = RedisBuckets(app.config['RATELIMIT_REDIS_URL'])
+    else:
+        app.extensions['rate_limits'] = MemoryBuckets(app.config['RATELIMIT_MAX_KEYS'])
+
+
+def clientAddress():
+    # The client's own address once ProxyFix has applied TRUSTED_PROXY_HOPS, rather than the proxy's
+    return request.remote_addr or 'unknown'
+
+
+def submittedUsername():
+    # Lowercased so changing the case of a username doesn't get a fresh bucket
+    return request.form.get('username', '').strip().lower() or None
+
+
+def waitFor(limit, key):
+    # Takes a token from the named RATE_LIMITS bucket for the key; returns the seconds to wait when there was none
+    requests, seconds = current_app.config['RATE_LIMITS'][limit]
+    rate_limit_checks.inc(limit=limit)
+    return current_app.extensions['rate_limits'].take(f'{limit}:{key}', requests, requests / seconds)
+
+
+def rateLimited(*limits):
+    # Rejects POSTs with 429 Too Many Requests, before the view does any work, once any of the limits is
+    # spent. Each limit is (RATE_LIMITS name, function giving the key to count against, or None to skip).
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == 'POST' and current_app.config['RATELIMIT_ENABLED']:
+                for limit, keyFor in limits:
+                    key = keyFor()
+                    wait = waitFor(limit, key) if key is not None else 0
+                    if wait:
+                        rate_limited.inc(limit=limit)
+                        response = make_response(render_template('errors/429.html', retry_after=ceil(wait)), 429)
+                        response.headers['Retry-After'] = str(ceil(wait))
+                        return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,59 @@
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+from app import db
+from app.models import Employee
+
+# Employees for pages and responses that only display them. They are read with Core selects into plain
+# tuples, so there is no ORM instance, identity map entry or change tracking per row, and experience is
+# read as a float instead of being converted to a Decimal.
+
+EMPLOYEE_FIELDS = ('employee_id', 'name', 'email', 'date_of_joining', 'current_role', 'past_roles', 'skills',
+                   'experience', 'educational_background', 'skill_points', 'achievement_badge')
+EmployeeRow = namedtuple('EmployeeRow', EMPLOYEE_FIELDS)
+
+# Values that need converting for JSON, as read
+JSON_CONVERSIONS = {'date_of_joining': date.isoformat}
+
+
+def _column(name):
+    column = Employee.__table__.c[name]
+    if name == 'experience':
+        return db.cast(column, db.Float).label(name)
+    return column
+
+
+@lru_cache(maxsize=256)
+def selectEmployees(fields=EMPLOYEE_FIELDS):
+    # The SELECT of the given fields, built once per field list and refined per request with where() and
+    # order_by(); statements of the same shape then also share one compiled form in SQLAlchemy's cache
+    return db.select(*[_column(name) for name in fields])
+
+
+def readRows(query):
+    # Runs a select on the session's connection, in its transaction. Session.execute() would pass even a
+    # Core select through the ORM's loading machinery, which costs more per row than reading the row.
+    return db.session.connection().execute(query)
+
+
+def employeeRows(query):
+    # Every employee the query (a selectEmployees() select of all fields) returns, as EmployeeRows
+    return list(map(EmployeeRow._make, readRows(query)))
+
+
+@lru_cache(maxsize=256)
+def rowMapper(fields):
+    # A function turning a row of the given fields into a dict, built once per distinct field list
+    conversions = [(name, JSON_CONVERSIONS[name]) for name in fields if name in JSON_CONVERSIONS]
+
+    def mapRow(row):
+        record = dict(zip(fields, row))
+        for name, convert in conversions:
+            record[name] = convert(record[name])
+        return record
+    return mapRow
+
+
+def employeeDict(row):
+    # The same keys and values as Employee.to_dict()
+    return rowMapper(row._fields)(row)
@@ -0,0 +1,113 @@
+import re
+from threading import Lock
+from sqlalchemy import DDL, event, text
+from app import db
+from app.models import Employee
+
+RESULTS_PER_PAGE = 20
+# bm25 weights for skills, past_roles and educational_background: a skill match counts most
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+# An external-content FTS5 table: the text stays in employees and the index only holds its tokens.
+# The triggers keep it in step with every insert, delete and update of the searched columns.
+SEARCH_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts USING fts5(
+        skills, past_roles, educational_background,
+        content='employees', content_rowid='employee_id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS employees_fts_insert AFTER INSERT ON employees BEGIN
+        INSERT INTO employees_fts(rowid, skills, past_roles, educational_background)
+        VALUES (new.employee_id, new.skills, new.past_roles, new.educational_background);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS employees_fts_delete AFTER DELETE ON employees BEGIN
+        INSERT INTO employees_fts(employees_fts, rowid, skills, past_roles, educational_background)
+        VALUES ('delete', old.employee_id, old.skills, old.past_roles, old.educational_background);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS employees_fts_update
+    AFTER UPDATE OF skills, past_roles, educational_background ON employees BEGIN
+        INSERT INTO employees_fts(employees_fts, rowid, skills, past_roles, educational_background)
+        VALUES ('delete', old.employee_id, old.skills, old.past_roles, old.educational_background);
+        INSERT INTO employees_fts(rowid, skills, past_roles, educational_background)
+        VALUES (new.employee_id, new.skills, new.past_roles, new.educational_background);
+    END""",
+]
+
+for statement in SEARCH_SCHEMA:
+    event.listen(Employee.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+_indexed_databases = set()  # URLs of databases known to have the index, as apps may use different ones
+_index_lock = Lock()
+
+
+def usesSearchIndex():
+    # FTS5 is SQLite's; on other databases search falls back to scanning with ILIKE
+    return db.engine.dialect.name == 'sqlite'
+
+
+def rebuildSearchIndex():
+    # Creates the index and triggers if they are missing, then re-reads every employee into it
+    if not usesSearchIndex():
+        return False
+    with db.engine.begin() as connection:
+        for statement in SEARCH_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO employees_fts(employees_fts) VALUES ('rebuild')"))
+    return True
+
+
+def ensureSearchIndex():
+    url = str(db.engine.url)
+    with _index_lock:
+        if url not in _indexed_databases:
+            exists = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'employees_fts'")).first()
+            if not exists:
+                rebuildSearchIndex()
+            _indexed_databases.add(url)
+
+
+def searchWords(query):
+    return re.findall(r'[\w+#.*-]+', query)
+
+
+def matchExpression(query):
+    # Turns free text into an FTS5 query: every word must match, and a trailing * keeps prefix matching.
+    # Words are quoted so FTS5 operators and punctuation in the input are taken literally.
+    terms = []
+    for word in searchWords(query):
+        prefix = word.endswith('*')
+        word = word.rstrip('*').strip('.-')
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def searchEmployees(query, page=1, per_page=RESULTS_PER_PAGE):
+    # Ranked matches for the query, best first, with a highlighted snippet of the matching text
+    expression = matchExpression(query)
+    if not expression:
+        return []
+    if not usesSearchIndex():
+        return _searchWithoutIndex(query, page, per_page)
+    ensureSearchIndex()
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    rows = db.session.execute(text(f"""
+        SELECT e.employee_id, e.name, e.current_role, e.achievement_badge,
+               snippet(employees_fts, -1, '[', ']', '...', 12) AS snippet
+        FROM employees_fts JOIN employees e ON e.employee_id = employees_fts.rowid
+        WHERE employees_fts MATCH :expression
+        ORDER BY bm25(employees_fts, {weights})
+        LIMIT :limit OFFSET :offset"""),
+        dict(expression=expression, limit=per_page, offset=(max(page, 1) - 1) * per_page))
+    return rows.mappings().all()
+
+
+def _searchWithoutIndex(query, page, per_page):
+    # Every word must appear in one of the searched columns; results come back unranked
+    columns = (Employee.skills, Employee.past_roles, Employee.educational_background)
+    words = [word.rstrip('*').strip('.-') for word in searchWords(query)]
+    conditions = [db.or_(*[column.icontains(word, autoescape=True) for column in columns]) for word in words if word]
+    rows = db.session.execute(db.select(Employee.employee_id, Employee.name, Employee.current_role,
+                                        Employee.achievement_badge, Employee.skills.label('snippet'))
+                              .where(*conditions).order_by(Employee.employee_id)
+                              .limit(per_page).offset((max(page, 1) - 1) * per_page))
+    return rows.mappings().all()
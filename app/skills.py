@@ -0,0 +1,180 @@
+import re
+from itertools import chain
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Employee, Skill, EmployeeSkill
+
+# Skills text is a free-form list: "Python, SQL; Machine Learning"
+SKILL_SEPARATORS = re.compile(r'[,;|\n]+')
+MAX_SKILL_LENGTH = 100
+# Items per statement for lookups and writes over arbitrarily many ids or rows: an IN (...) list, or an
+# executemany's rows, each take a bound parameter per value, and SQLite refuses statements with more than
+# SQLITE_MAX_VARIABLE_NUMBER of them (999 before 3.32). 500 stays under it with room for other conditions.
+CHUNK_SIZE = 500
+
+
+def parseSkills(text):
+    # {normalised name: display name} for each distinct skill named in the text
+    skills = {}
+    for part in SKILL_SEPARATORS.split(text or ''):
+        display_name = ' '.join(part.split())[:MAX_SKILL_LENGTH]
+        if display_name:
+            skills.setdefault(display_name.lower(), display_name)
+    return skills
+
+
+def chunks(items, size=CHUNK_SIZE):
+    # Lists of up to `size` items, for one statement each (see CHUNK_SIZE)
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert(session, table):
+    # INSERT supporting ON CONFLICT for whichever backend the session is bound to
+    if session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects import postgresql  # Only loaded where it's used
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def skillIds(session, skills):
+    # Ids for the given {name: display name} skills, adding any the taxonomy doesn't know yet
+    ids = {}
+    for names in chunks(skills):
+        session.execute(_insert(session, Skill.__table__).on_conflict_do_nothing(index_elements=['name']),
+                        [dict(name=name, display_name=skills[name]) for name in names])
+        ids.update(session.execute(db.select(Skill.name, Skill.skill_id).where(Skill.name.in_(names))).all())
+    return ids
+
+
+def syncEmployeeSkills(session, employee_skills):
+    # Brings employee_skills in line with the profile skills text, given as {employee_id: skills text}.
+    # Skills dropped from the text are removed unless an assessment rated them, in which case they are
+    # only marked as no longer listed.
+    parsed = {employee_id: parseSkills(text) for employee_id, text in employee_skills.items()}
+    ids = skillIds(session, {name: display for skills in parsed.values() for name, display in skills.items()})
+    table = EmployeeSkill.__table__
+    for employee_ids in chunks(parsed):
+        existing = {}
+        for row in session.execute(db.select(table.c.employee_id, table.c.skill_id, table.c.listed,
+                                             table.c.self_rating, table.c.supervisor_rating)
+                                   .where(table.c.employee_id.in_(employee_ids))):
+            existing[(row.employee_id, row.skill_id)] = row
+        inserts, relist, unlist, deletes = [], [], [], []
+        for employee_id in employee_ids:
+            wanted = {ids[name] for name in parsed[employee_id]}
+            for skill_id in wanted:
+                row = existing.get((employee_id, skill_id))
+                if row is None:
+                    inserts.append(dict(employee_id=employee_id, skill_id=skill_id, listed=True))
+                elif not row.listed:
+                    relist.append(dict(e_id=employee_id, s_id=skill_id))
+            for (row_employee_id, skill_id), row in existing.items():
+                if row_employee_id != employee_id or skill_id in wanted or not row.listed:
+                    continue
+                target = dict(e_id=employee_id, s_id=skill_id)
+                if row.self_rating is None and row.supervisor_rating is None:
+                    deletes.append(target)
+                else:
+                    unlist.append(target)
+        key = db.and_(table.c.employee_id == db.bindparam('e_id'), table.c.skill_id == db.bindparam('s_id'))
+        if inserts:
+            session.execute(db.insert(table), inserts)
+        if relist:
+            session.execute(db.update(table).where(key).values(listed=True), relist)
+        if unlist:
+            session.execute(db.update(table).where(key).values(listed=False), unlist)
+        if deletes:
+            session.execute(db.delete(table).where(key), deletes)
+
+
+def rateSkills(session, assessments):
+    # Records assessment ratings, given as (employee_id, skills text, {rating column: rating}), against each
+    # skill named in the text, adding the skill to the employee if they didn't list it themselves. Takes one
+    # taxonomy lookup for all of them and one upsert per set of rated columns; later ratings of a skill win.
+    parsed = [(employee_id, parseSkills(text), ratings) for employee_id, text, ratings in assessments if ratings]
+    ids = skillIds(session, {name: display for employee_id, skills, ratings in parsed for name, display in skills.items()})
+    groups = {}  # {rated columns: {(employee_id, skill_id): row}}
+    for employee_id, skills, ratings in parsed:
+        rows = groups.setdefault(tuple(sorted(ratings)), {})
+        for name in skills:
+            rows[(employee_id, ids[name])] = dict(employee_id=employee_id, skill_id=ids[name], listed=False, **ratings)
+    for columns, rows in groups.items():
+        statement = _insert(session, EmployeeSkill.__table__)
+        statement = statement.on_conflict_do_update(index_elements=['employee_id', 'skill_id'],
+                                                    set_={column: statement.excluded[column] for column in columns})
+        for chunk in chunks(rows.values()):
+            session.execute(statement, chunk)
+
+
+@event.listens_for(Session, 'after_flush')
+def syncChangedSkills(session, flush_context):
+    # Profile edits made through the ORM keep the taxonomy current in the same transaction
+    changed = {}
+    deleted = []
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Employee) and inspect(obj).attrs.skills.history.has_changes():
+            changed[obj.employee_id] = obj.skills
+    for obj in session.deleted:
+        if isinstance(obj, Employee):
+            deleted.append(obj.employee_id)
+    if changed:
+        syncEmployeeSkills(session, changed)
+    for employee_ids in chunks(deleted):
+        session.execute(db.delete(EmployeeSkill).where(EmployeeSkill.employee_id.in_(employee_ids)))
+
+
+def ingestAllSkills(batch_size=1000):
+    # (Re)builds employee_skills from every employee's skills text, a batch of employees at a time
+    last_id = 0
+    total = 0
+    while True:
+        rows = db.session.execute(db.select(Employee.employee_id, Employee.skills)
+                                  .where(Employee.employee_id > last_id)
+                                  .order_by(Employee.employee_id).limit(batch_size)).all()
+        if not rows:
+            break
+        syncEmployeeSkills(db.session, dict(rows))
+        db.session.commit()
+        last_id = rows[-1].employee_id
+        total += len(rows)
+    return total
+
+
+def headcountBySkill(limit=50):
+    # Employees per skill, largest first, counted from the (skill_id, employee_id) index alone
+    headcount = db.func.count(EmployeeSkill.employee_id).label('headcount')
+    counts = (db.select(EmployeeSkill.skill_id, headcount).group_by(EmployeeSkill.skill_id)
+              .order_by(headcount.desc()).limit(limit).subquery())
+    return db.session.execute(db.select(Skill.display_name, counts.c.headcount)
+                              .join(counts, counts.c.skill_id == Skill.skill_id)
+                              .order_by(counts.c.headcount.desc())).all()
+
+
+def employeesWithAllSkills(names, limit=100):
+    # Employees holding every one of the named skills: the intersection of each skill's posting list
+    skills = parseSkills(','.join(names))
+    if not skills:
+        return []
+    ids = dict(db.session.execute(db.select(Skill.name, Skill.skill_id).where(Skill.name.in_(skills))).all())
+    if len(ids) < len(skills):
+        return []  # Nobody can hold a skill the taxonomy has never seen
+    holders = db.intersect(*[db.select(EmployeeSkill.employee_id).where(EmployeeSkill.skill_id == skill_id)
+                             for skill_id in ids.values()]).subquery()
+    return db.session.execute(db.select(Employee).join(holders, holders.c.employee_id == Employee.employee_id)
+                              .order_by(Employee.employee_id).limit(limit)).scalars().all()
+
+
+def skillGaps(employee, limit=10):
+    # Skills most common among others in the employee's current role that the employee doesn't hold
+    peers = db.select(Employee.employee_id).where(Employee.current_role == employee.current_role,
+                                                  Employee.employee_id != employee.employee_id)
+    held = db.select(EmployeeSkill.skill_id).where(EmployeeSkill.employee_id == employee.employee_id)
+    headcount = db.func.count(EmployeeSkill.employee_id).label('headcount')
+    return db.session.execute(db.select(Skill.display_name, headcount)
+                              .join(EmployeeSkill, EmployeeSkill.skill_id == Skill.skill_id)
+                              .where(EmployeeSkill.employee_id.in_(peers), EmployeeSkill.skill_id.not_in(held))
+                              .group_by(Skill.skill_id).order_by(headcount.desc()).limit(limit)).all()
@@ -0,0 +1,249 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response
+from flask_login import current_user, login_required
+from app import db
+from app.models import Employee
+from app.directory import directoryFilters
+from app.skills import headcountBySkill, employeesWithAllSkills, skillGaps
+from app.analytics import organisationAnalytics
+from app.cache import etagged
+
+bp = Blueprint('admin', __name__)
+
+
+@bp.route('/admin', methods=['GET'])
+@login_required
+def admin():
+    # employee = Employee.query.filter_by(employee_id=current_user.user_id).all()
+    return render_template('2_admin.html', title='Admin')
+
+
+@bp.route('/addEmployee', methods=['GET', 'POST'])
+@login_required
+def addEmployee():
+    from app.forms import AddEmployeeForm
+    form = AddEmployeeForm()
+    if form.validate_on_submit():
+        new_employee = Employee(
+            name=form.name.data,
+            email=form.email.data,
+            date_of_joining=form.date_of_joining.data,
+            current_role=form.current_role.data,
+            past_roles=form.past_roles.data,
+            skills=form.skills.data,
+            experience=float(form.experience.data),
+            educational_background=form.educational_background.data
+        )
+        db.session.add(new_employee)
+        try:
+            db.session.commit()
+            flash(f'New Employee added: {form.name.data}', 'success')
+            return redirect(url_for('employee.home'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Failed to add Employee: {str(e)}', 'danger')
+            if Employee.query.filter_by(email=form.email.data).first():
+                form.email.errors.append('This email address is already registered. Please choose another.')
+    return render_template('2_admin_1_addEmployee.html', title='Add Employee', form=form)
+
+
+@bp.route('/skillsReport', methods=['GET'])
+@login_required
+def skillsReport():
+    # Headcount per skill, plus a staffing search for employees holding all of the requested skills
+    wanted = request.args.get('skills', '').strip()
+    headcount = headcountBySkill()
+    holders = employeesWithAllSkills([wanted]) if wanted else []
+    if request.args.get('format') == 'json':
+        return jsonify(headcount=[dict(skill=name, headcount=count) for name, count in headcount],
+                       skills=wanted, employees=[employee.to_dict() for employee in holders])
+    return render_template('2_admin_3_skillsReport.html', title='Skills Report', headcount=headcount,
+                           wanted=wanted, holders=holders)
+
+
+@bp.route('/admin/analytics', methods=['GET'])
+@login_required
+@etagged
+def analytics():
+    # Workforce totals read from the running totals in employee_summary, not from the employees table
+    stats = organisationAnalytics()
+    if request.args.get('format') == 'json':
+        return jsonify(headcount=stats.headcount, average_experience=stats.average_experience,
+                       roles=[role._asdict() for role in stats.roles],
+                       badges=[dict(badge=badge, headcount=count) for badge, count in stats.badges],
+                       skill_point_percentiles={f'p{p}': value for p, value in stats.percentiles.items()},
+                       max_skill_points=stats.max_points)
+    return render_template('2_admin_4_analytics.html', title='Analytics', stats=stats)
+
+
+@bp.route('/skillGaps', methods=['GET'])
+@login_required
+def skillGapsReport():
+    employee = Employee.query.get_or_404(current_user.user_id)
+    return jsonify(current_role=employee.current_role,
+                   gaps=[dict(skill=name, peers=count) for name, count in skillGaps(employee)])
+
+
+@bp.route('/bulkAddEmployee', methods=['GET', 'POST'])
+@login_required
+def bulkAddEmployee():
+    from app.forms import UploadEmployeesForm
+    from app.jobs import enqueueEmployeeImport, getJob
+    form = UploadEmployeesForm()
+    if form.validate_on_submit():
+        # The import runs on a background worker; the page polls /jobs/<id> for its progress
+        job_id = enqueueEmployeeImport(form.employee_file.data, actor_id=current_user.user_id)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(job_id=job_id, status_url=url_for('admin.jobStatus', job_id=job_id)), 202
+        flash('Employee upload received and queued for import', 'info')
+        return redirect(url_for('admin.bulkAddEmployee', job=job_id))
+    job = getJob(request.args['job']) if request.args.get('job') else None
+    return render_template('2_admin_2_bulkAddEmployee.html', title='Bulk Add Employee', form=form, job=job)
+
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def jobStatus(job_id):
+    from app.jobs import getJob
+    job = getJob(job_id)
+    if job is None:
+        return jsonify(error='Job not found'), 404
+    return jsonify(job.to_dict())
+
+
+@bp.route('/assessments/bulk', methods=['POST'])
+@login_required
+def bulkAssessments():
+    # A supervisor's assessments for a whole team as JSON, {"assessments": [{"employee_id": .., ...}, ...]}.
+    # They are stored together in one transaction, or not at all if any of them is invalid.
+    from app.assessments import parseAssessment, missingEmployees, recordAssessments
+    payload = request.get_json(silent=True)
+    records = payload.get('assessments') if isinstance(payload, dict) else None
+    if not isinstance(records, list) or not records:
+        return jsonify(errors=['Expected a JSON object with a non-empty "assessments" list']), 400
+    errors = []
+    assessments = [parseAssessment(record, index, errors) for index, record in enumerate(records, start=1)]
+    if not errors:
+        errors += [f'No employee has id {employee_id}'
+                   for employee_id in sorted(missingEmployees(a['employee_id'] for a in assessments))]
+    if errors:
+        return jsonify(errors=errors), 400
+    points = recordAssessments(db.session, assessments, assessor_id=current_user.user_id)
+    db.session.commit()
+    return jsonify(created=len(assessments), points_awarded=points), 201
+
+
+@bp.route('/employees/<int:employee_id>/assessments', methods=['GET'])
+@login_required
+def employeeAssessments(employee_id):
+    from app.assessments import assessmentHistory
+    history, next_before = assessmentHistory(employee_id, before=request.args.get('before', type=int))
+    return jsonify(assessments=[assessment.to_dict() for assessment in history],
+                   next=url_for('admin.employeeAssessments', employee_id=employee_id, before=next_before)
+                   if next_before else None)
+
+
+@bp.route('/employees/<int:employee_id>/goals', methods=['GET'])
+@login_required
+def employeeGoals(employee_id):
+    from app.assessments import goalHistory
+    history, next_before = goalHistory(employee_id, before=request.args.get('before', type=int))
+    return jsonify(goals=[goal.to_dict() for goal in history],
+                   next=url_for('admin.employeeGoals', employee_id=employee_id, before=next_before)
+                   if next_before else None)
+
+
+@bp.route('/exportEmployees', methods=['GET'])
+@login_required
+def exportEmployees():
+    # Streams every employee matching the directory filters as CSV (the bulk upload layout) or NDJSON.
+    # gzip=1 downloads a .gz file; otherwise the response is gzipped whenever the client accepts it.
+    from app.export import exportBatches, csvChunks, ndjsonChunks, gzipChunks
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify(error='format must be csv or ndjson'), 400
+    batches = exportBatches(db.engine, **directoryFilters(request.args))
+    chunks = csvChunks(batches) if export_format == 'csv' else ndjsonChunks(batches)
+    filename = f'employees.{export_format}'
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    headers = {}
+    if request.args.get('gzip') == '1':
+        chunks, filename, mimetype = gzipChunks(chunks), filename + '.gz', 'application/gzip'
+    elif 'gzip' in request.accept_encodings:
+        chunks = gzipChunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    headers['Content-Disposition'] = f'attachment; filename={filename}'
+    headers['Vary'] = 'Accept-Encoding'
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+
+# # 2
+# @app.route('/shopping', methods=['GET', 'POST'])
+# @login_required
+# def shopping():
+#     sform = ShoppingForm()
+#     tform = BuyForm()
+#     tobuy = ToBuy.query.filter_by(user_id=current_user.user_id)
+#     bought = Bought.query.filter_by(user_id=current_user.user_id)
+#     if sform.validate_on_submit():
+#         new_tobuy = ToBuy(item=sform.item.data, user_id=current_user.user_id)
+#         db.session.add(new_tobuy)
+#         try:
+#             db.session.commit()
+#             flash(f'New Item {sform.item.data} added to to buy list', 'success')
+#             return redirect(url_for('home'))
+#         except:
+#             db.session.rollback()
+#             flash(f'Item not added. Please try again', 'danger')
+#     if tform.validate_on_submit():
+#         buyitem = request.values.get('buy')
+#         new_bought = Bought(item=buyitem, user_id=current_user.user_id)
+#         # del_tobuy = ToBuy.query.filter(and_(item=buyitem, user_id=current_user.user_id))
+#         db.session.add(new_bought)
+#         # db.session.delete(del_tobuy)
+#         db.session.commit()
+#         return redirect(url_for('shopping'))
+#     return render_template('shopping.html', title='Shopping', sform=sform, tform=tform, tobuy=tobuy, bought=bought)
+
+
+# 4
+# @app.route('/upload_tobuylist', methods=['GET', 'POST'])
+# @login_required
+# def upload_tobuylist():
+#     form = UploadItemsForm()
+#     if form.validate_on_submit():
+#         if form.items_file.data:
+#             unique_str = str(uuid4())
+#             filename = secure_filename(f'{unique_str}-{form.items_file.data.filename}')
+#             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+#             form.items_file.data.save(filepath)
+#             try:
+#                 with (open(filepath, "r") as txtfile):
+#                     items = []
+#                     for line in txtfile:
+#                         line = line.strip()
+#                         items.append(line)
+#                     for i in items:
+#                         new_tobuy = ToBuy(item=i, user_id=current_user.user_id)
+#                         db.session.add(new_tobuy)
+#                 db.session.commit()
+#                 flash(f'To buy list Uploaded', 'success')
+#                 return redirect(url_for('home'))
+#             except:
+#                 flash(f'To buy list upload failed: '
+#                       'please try again', 'danger')
+#                 db.session.rollback()
+#             finally:
+#                 silent_remove(filepath)
+#     return render_template('upload_tobuylist.html', title='Upload to buy list', form=form)
+
+
+# Handler for 413 Error: "RequestEntityTooLarge". This error is caused by a file upload
+# exceeding its permitted Capacity
+# Note, you should add handlers for:
+# 403 Forbidden
+# 404 Not Found
+# 500 Internal Server Error
+# See: https://en.wikipedia.org/wiki/List_of_HTTP_status_codes
+@bp.app_errorhandler(413)
+def error_413(error):
+    return render_template('errors/413.html'), 413
@@ -0,0 +1,114 @@
+from flask import Blueprint, request, jsonify, url_for, abort, make_response
+from flask_login import login_required
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.api import (parseFields, employeePage, employeesById, parseEmployeeChange, emailConflicts,
+                     applyEmployeeChanges, PAGE_SIZE, MAX_BATCH_IDS)
+from app.directory import directoryFilters
+from app.audit import changesSince, MAX_CHANGES
+from app.cache import etagged
+
+# Versioned JSON API. Reads answer 304 to a matching If-None-Match, like the pages do.
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+@bp.errorhandler(401)
+def unauthorized(error):
+    return jsonify(error='Log in first'), 401
+
+
+@bp.errorhandler(404)
+def notFound(error):
+    return jsonify(error='Not found'), 404
+
+
+def _badRequest(*errors):
+    abort(make_response(jsonify(errors=list(errors)), 400))
+
+
+def _fields():
+    fields, unknown = parseFields(request.args.get('fields'))
+    if unknown:
+        _badRequest(*[f'Unknown field: {name}' for name in unknown])
+    return fields
+
+
+def _ids(text):
+    try:
+        ids = [int(part) for part in text.split(',') if part.strip()]
+    except ValueError:
+        _badRequest('ids must be a comma separated list of employee ids')
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        _badRequest(f'ids must list 1 to {MAX_BATCH_IDS} employee ids')
+    return ids
+
+
+@bp.route('/employees', methods=['GET'])
+@login_required
+@etagged
+def employees():
+    # A page at a time in employee_id order, filtered like the directory, or ?ids=1,2,3 for just those
+    # employees in the order asked. fields=name,email returns only those fields (and employee_id).
+    fields = _fields()
+    if 'ids' in request.args:
+        ids = _ids(request.args['ids'])
+        found = employeesById(fields, ids)
+        return jsonify(employees=[found[employee_id] for employee_id in ids if employee_id in found],
+                       missing=[employee_id for employee_id in ids if employee_id not in found])
+    records, next_after = employeePage(fields, after=request.args.get('after', type=int),
+                                       limit=request.args.get('limit', PAGE_SIZE, type=int),
+                                       **directoryFilters(request.args))
+    next_args = dict(request.args.items(), after=next_after)
+    return jsonify(employees=records, next=url_for('api.employees', **next_args) if next_after is not None else None)
+
+
+@bp.route('/employees/<int:employee_id>', methods=['GET'])
+@login_required
+@etagged
+def employee(employee_id):
+    found = employeesById(_fields(), [employee_id])
+    if employee_id not in found:
+        abort(404)
+    return jsonify(found[employee_id])
+
+
+@bp.route('/changes', methods=['GET'])
+@login_required
+def changes():
+    # The employee change log oldest first, for tailing or replaying: pass the returned `after` back to get
+    # the entries logged since. employee_id= narrows it to one employee.
+    after = request.args.get('after', 0, type=int)
+    entries = changesSince(after, limit=request.args.get('limit', MAX_CHANGES, type=int),
+                           employee_id=request.args.get('employee_id', type=int))
+    return jsonify(changes=[entry.to_dict() for entry in entries],
+                   after=entries[-1].entry_id if entries else after)
+
+
+@bp.route('/employees', methods=['PATCH'])
+@login_required
+def patchEmployees():
+    # {"employees": [{"employee_id": 1, "current_role": "Team Lead"}, ...]}, applied together in one
+    # transaction, or not at all if any change is invalid
+    from app.assessments import missingEmployees
+    payload = request.get_json(silent=True)
+    records = payload.get('employees') if isinstance(payload, dict) else None
+    if not isinstance(records, list) or not records:
+        return jsonify(errors=['Expected a JSON object with a non-empty "employees" list']), 400
+    errors = []
+    changes = [parseEmployeeChange(record, index, errors) for index, record in enumerate(records, start=1)]
+    if not errors:
+        errors += [f'No employee has id {employee_id}'
+                   for employee_id in sorted(missingEmployees(change['employee_id'] for change in changes))]
+    if errors:
+        return jsonify(errors=errors), 400
+    conflicts = emailConflicts(changes)
+    if conflicts:
+        return jsonify(errors=[f'The email address {email} is already used by another employee'
+                               for email in conflicts]), 409
+    try:
+        updated = applyEmployeeChanges(db.session, changes)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(errors=['An email address in the changes is already used by another employee']), 409
+    return jsonify(updated=updated)
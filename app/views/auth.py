@@ -0,0 +1,62 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import current_user, login_user, logout_user
+from urllib.parse import urlsplit
+from app import db
+from app.models import User, forgetUser
+from app.ratelimit import rateLimited, clientAddress, submittedUsername
+
+bp = Blueprint('auth', __name__)
+
+
+@bp.route('/register', methods=['GET', 'POST'])
+@rateLimited(('register_ip', clientAddress))
+def register():
+    from app.forms import RegistrationForm
+    if current_user.is_authenticated:
+        return redirect(url_for('employee.home'))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        new_user = User(username=form.username.data, email=form.email.data)
+        new_user.set_password(form.password.data)
+        db.session.add(new_user)
+        try:
+            db.session.commit()
+            flash(f'Registration for {form.username.data} received', 'success')
+            return redirect(url_for('employee.home'))
+        except:
+            # The form checked for duplicates, so only a registration made meanwhile can get here
+            db.session.rollback()
+            flash(f'Registration failed: the username or email address was just taken', 'danger')
+    return render_template('0_2_registration.html', title='Register', form=form)
+
+
+# Checked before the form is read, so rejected attempts never reach the password hash
+@bp.route('/login', methods=['GET', 'POST'])
+@rateLimited(('login_ip', clientAddress), ('login_username', submittedUsername))
+def login():
+    from app.forms import LoginForm
+    if current_user.is_authenticated:
+        return redirect(url_for('employee.home'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        if user is None or not user.check_password(form.password.data):
+            flash('Invalid username or password', 'danger')
+            return redirect(url_for('auth.login'))
+        if user.password_needs_rehash():
+            user.set_password(form.password.data)
+            db.session.commit()
+        login_user(user, remember=form.remember_me.data)
+        next_page = request.args.get('next')
+        if not next_page or urlsplit(next_page).netloc != '':
+            next_page = url_for('employee.home')
+        return redirect(next_page)
+    return render_template('0_3_login.html', title='Sign In', form=form)
+
+
+@bp.route('/logout')
+def logout():
+    if current_user.is_authenticated:
+        forgetUser(current_user.user_id)
+    logout_user()
+    return redirect(url_for('employee.home'))
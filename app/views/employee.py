@@ -0,0 +1,199 @@
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
+from flask_login import current_user, login_required
+from app import db
+from app.models import Employee, Goal, BADGE_TIERS, DEFAULT_BADGE
+from app.leaderboard import leaderboardPage, parseCursor, rankAround, standingOf
+from app.directory import directoryPage, directoryFilters, PAGE_SIZE, SORT_COLUMNS
+from app.readmodel import employeeDict
+from app.search import searchEmployees, RESULTS_PER_PAGE
+from app.plans import developmentPlanFor
+from app.cache import fragment, etagged
+
+bp = Blueprint('employee', __name__)
+
+
+@bp.route('/')
+@bp.route('/home')
+@login_required
+@etagged
+def home():
+    employee = Employee.query.filter_by(employee_id=current_user.user_id).first()
+    return render_template('1_home.html', title='Home', employee=employee)
+
+
+@bp.route('/')
+@bp.route('/leaderboard')
+@login_required
+@etagged
+def leaderboard():
+    after, before = parseCursor(request.args.get('after')), parseCursor(request.args.get('before'))
+    if after is not None:
+        before = None
+
+    def renderTable():
+        # Only read on a cache miss; the page links go in the fragment with the rows they follow
+        entries, has_previous, has_next = leaderboardPage(after=after, before=before)
+        return render_template('fragments/leaderboard_table.html', entries=entries, has_previous=has_previous,
+                               has_next=has_next)
+
+    table = fragment('leaderboard_table', renderTable, after, before)
+    employee = standingOf(current_user.user_id)
+    rank, around = rankAround(employee) if employee else (None, [])
+    return render_template('1_home_1_leaderboard.html', title='Leaderboard', employee=employee,
+                           leaderboard_table=table, rank=rank, around=around)
+
+
+@bp.route('/leaderboard/me', methods=['GET'])
+@login_required
+def leaderboardRank():
+    employee = standingOf(current_user.user_id)
+    if employee is None:
+        abort(404)
+    radius = min(max(request.args.get('radius', 2, type=int), 0), 10)
+    rank, around = rankAround(employee, radius=radius)
+    return jsonify(rank=rank, around=[entry._asdict() for entry in around])
+
+
+@bp.route('/employeeProfile', methods=['GET'])
+@login_required
+@etagged
+def employeeProfile():
+    employee = Employee.query.filter_by(employee_id=current_user.user_id).first()
+    card = fragment('profile_card', lambda: render_template('fragments/profile_card.html', employee=employee),
+                    per_user=True)
+    return render_template('1_home_2_employeeProfile.html', title='Employee Profile', employee=employee,
+                           profile_card=card)
+
+
+@bp.route('/updateEmployeeProfile', methods=['GET', 'POST'])
+@login_required
+def updateEmployeeProfile():
+    employee = Employee.query.get_or_404(current_user.user_id)
+    if request.method == 'POST':
+        if request.form['date_of_joining']:
+            try:
+                employee.date_of_joining = datetime.strptime(request.form['date_of_joining'], '%Y-%m-%d').date()
+            except ValueError:
+                flash('Invalid date format for Date of Joining.', 'danger')
+                return redirect(url_for('employee.updateEmployeeProfile'))
+        if request.form['email']:
+            from app.emails import normalizeEmail, emailKey, emailsInUse
+            email, reason = normalizeEmail(request.form['email'])
+            if email is None:
+                flash('Invalid email address.', 'danger')
+                return redirect(url_for('employee.updateEmployeeProfile'))
+            if emailsInUse([email]).get(emailKey(email), employee.employee_id) != employee.employee_id:
+                flash('This email address is already registered. Please choose another', 'danger')
+                return redirect(url_for('employee.updateEmployeeProfile'))
+            employee.email = email
+        if request.form['current_role']:
+            employee.current_role = request.form['current_role']
+        if request.form['past_roles']:
+            employee.past_roles = request.form['past_roles']
+        if request.form['skills']:
+            employee.skills = request.form['skills']
+        if request.form['experience']:
+            try:
+                employee.experience = round(float(request.form['experience']), 1)
+            except ValueError:
+                flash('Experience must be a number of years.', 'danger')
+                return redirect(url_for('employee.updateEmployeeProfile'))
+        if request.form['educational_background']:
+            employee.educational_background = request.form['educational_background']
+        if request.form['skill_points']:
+            try:
+                employee.skill_points = int(request.form['skill_points'])
+            except ValueError:
+                flash('Skill Points must be a whole number.', 'danger')
+                return redirect(url_for('employee.updateEmployeeProfile'))
+        db.session.commit()
+        flash('Your profile has been updated!', 'success')
+        return redirect(url_for('employee.employeeProfile'))
+    return render_template('1_home_3_updateEmployeeProfile.html', title='Update Profile', employee=employee)
+
+
+@bp.route('/skillAssessment', methods=['GET', 'POST'])
+@login_required
+def skillAssessment():
+    from app.forms import SkillAssessmentForm
+    from app.assessments import recordAssessments, assessmentHistory
+    employee = Employee.query.get_or_404(current_user.user_id)
+    form = SkillAssessmentForm()
+    if form.validate_on_submit():
+        assessment = dict(employee_id=employee.employee_id, self_assessed_skills=form.self_assessed_skills.data,
+                          self_rating=form.self_assessment_rating.data, new_competencies=form.new_competencies.data,
+                          supervisor_assessed_skills=form.supervisor_assessed_skills.data,
+                          supervisor_rating=form.supervisor_rating.data, future_skills=form.future_skills.data)
+        points = recordAssessments(db.session, [assessment], assessor_id=current_user.user_id)
+        db.session.commit()
+        if form.self_assessed_skills.data or form.new_competencies.data:
+            flash('Employee self-assessment has been saved.', 'success')
+        if form.supervisor_assessed_skills.data or form.supervisor_rating.data or form.future_skills.data:
+            flash('Supervisor assessment has been saved.', 'success')
+        if points:
+            flash(f'{points} skill points awarded.', 'success')
+        return redirect(url_for('employee.skillAssessment'))
+    history, next_before = assessmentHistory(employee.employee_id)
+    return render_template('1_home_4_skillAssessment.html', title='Skill Assessment', form=form, employee=employee,
+                           history=history)
+
+
+@bp.route('/goalSetting', methods=['GET', 'POST'])
+@login_required
+def goalSetting():
+    from app.forms import GoalSettingForm
+    from app.assessments import goalHistory
+    employee = Employee.query.get_or_404(current_user.user_id)
+    form = GoalSettingForm()
+    if form.validate_on_submit():
+        db.session.add(Goal(employee_id=employee.employee_id, goals=form.goals.data, kpis=form.kpis.data,
+                            feedback=form.feedback.data))
+        db.session.commit()
+        flash('Goals and KPIs have been submitted successfully!', 'success')
+        return redirect(url_for('employee.goalSetting'))
+    history, next_before = goalHistory(employee.employee_id)
+    return render_template('1_home_5_goalSetting.html', form=form, title='Goal Setting', employee=employee,
+                           history=history)
+
+
+@bp.route('/developmentPlan', methods=['GET', 'POST'])
+@login_required
+def developmentPlan():
+    employee = Employee.query.get_or_404(current_user.user_id)
+    plan = developmentPlanFor(employee.employee_id)
+    return render_template('1_home_6_developmentPlan.html', title='Development Plan', employee=employee,
+                           plan=plan.plan, generated_at=plan.generated_at)
+
+
+@bp.route('/listAllEmployees', methods=['GET'])
+def listAllEmployees():
+    # A page at a time of the employee directory; add format=json for the same page as JSON
+    filters = directoryFilters(request.args)
+    sort = request.args.get('sort', 'id')
+    descending = request.args.get('order') == 'desc'
+    employees, next_after = directoryPage(sort=sort, descending=descending,
+                                          after=request.args.get('after', type=int),
+                                          per_page=request.args.get('per_page', PAGE_SIZE, type=int), **filters)
+    first_args = {key: value for key, value in request.args.items() if key != 'after'}
+    next_args = dict(first_args, after=next_after) if next_after is not None else None
+    export_args = {key: value for key, value in filters.items() if value is not None}
+    if request.args.get('format') == 'json':
+        return jsonify(employees=[employeeDict(employee) for employee in employees],
+                       next=url_for('employee.listAllEmployees', **next_args) if next_args else None)
+    return render_template('test_listAllEmployees.html', title='List All Employees', employees=employees,
+                           first_args=first_args, next_args=next_args, export_args=export_args, filters=filters,
+                           sort=sort, descending=descending,
+                           sort_columns=SORT_COLUMNS, badges=[badge for minimum, badge in BADGE_TIERS] + [DEFAULT_BADGE])
+
+
+@bp.route('/search', methods=['GET'])
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    results = searchEmployees(query, page=page) if query else []
+    if request.args.get('format') == 'json':
+        return jsonify(query=query, page=page, results=[dict(result) for result in results])
+    return render_template('3_search.html', title='Search', query=query, page=page, results=results,
+                           has_next=len(results) == RESULTS_PER_PAGE)
@@ -0,0 +1,86 @@
+# Email validation throughput for imports, against a local DNS stub so nothing leaves the machine.
+#
+#   python -m benchmarks.emails --addresses 100000 --domains 500 --latency-ms 20
+#
+# Times syntax validation of every address (cold, then memoized), and the deliverability check of all of
+# them through app.emails.dnsLookup against a stub DNS server that answers after --latency-ms. Domains
+# named bad*.example.com don't exist; the rest have an MX record.
+import argparse
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+
+PORT = 0  # Any free port
+
+
+class StubDnsHandler(socketserver.BaseRequestHandler):
+    latency = 0.0
+
+    def handle(self):
+        import dns.message
+        import dns.rcode
+        import dns.rdatatype
+        import dns.rrset
+        data, sock = self.request
+        query = dns.message.from_wire(data)
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text().rstrip('.')
+        if name.startswith('bad'):
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        elif question.rdtype == dns.rdatatype.MX:
+            response.answer.append(dns.rrset.from_text(question.name, 300, 'IN', 'MX', f'10 mail.{name}.'))
+        time.sleep(self.latency)
+        sock.sendto(response.to_wire(), self.client_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark email validation and deliverability checks.')
+    parser.add_argument('--addresses', type=int, default=100000)
+    parser.add_argument('--domains', type=int, default=500, help='Distinct domains among the addresses')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Delay of each stub DNS answer')
+    parser.add_argument('--concurrency', type=int, default=20, help='EMAIL_DNS_CONCURRENCY')
+    args = parser.parse_args()
+
+    StubDnsHandler.latency = args.latency_ms / 1000
+    server = socketserver.ThreadingUDPServer(('127.0.0.1', PORT), StubDnsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'data.sqlite')
+    os.environ['JOBS_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'jobs.sqlite')
+    os.environ['AUDIT_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'audit.sqlite')
+    from app import create_app
+    from app.emails import normalizeEmail, undeliverableEmails
+    app = create_app(dict(EMAIL_DNS_NAMESERVERS=['127.0.0.1'], EMAIL_DNS_PORT=server.server_address[1],
+                          EMAIL_DNS_CONCURRENCY=args.concurrency))
+    domains = [f'{"bad" if n % 10 == 0 else "ok"}{n}.example.com' for n in range(args.domains)]
+    addresses = [f'User.{n}@{domains[n % len(domains)].upper()}' for n in range(args.addresses)]
+    result = dict(addresses=args.addresses, domains=args.domains, latency_ms=args.latency_ms,
+                  concurrency=args.concurrency)
+
+    t = time.perf_counter()
+    normalized = [normalizeEmail(address)[0] for address in addresses]
+    result['validate_cold_s'] = round(time.perf_counter() - t, 3)
+    t = time.perf_counter()
+    [normalizeEmail(address) for address in addresses]
+    result['validate_memoized_s'] = round(time.perf_counter() - t, 3)
+
+    with app.app_context():
+        t = time.perf_counter()
+        undeliverable = undeliverableEmails(normalized)
+        result['deliverability_s'] = round(time.perf_counter() - t, 3)
+        result['sequential_estimate_s'] = round(args.domains * args.latency_ms / 1000, 3)
+        result['undeliverable'] = len(undeliverable)
+        t = time.perf_counter()
+        undeliverableEmails(normalized)
+        result['deliverability_cached_s'] = round(time.perf_counter() - t, 3)
+    server.shutdown()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Cost of reading employees for display: ORM instances against the read model's Core rows.
+#
+#   python -m benchmarks.readpath --employees 100000 --rows 200 10000 100000
+#
+# Seeds a fresh SQLite database in a temporary directory, then for each row count reads that many employees
+# the way listAllEmployees used to (ORM Employee instances, which are rendered or turned into dicts) and
+# the way it does now (EmployeeRows from app.readmodel). Reports CPU per row and the memory allocated.
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+ATTRIBUTES = ('employee_id', 'name', 'email', 'date_of_joining', 'current_role', 'past_roles', 'skills',
+              'experience', 'educational_background', 'skill_points', 'achievement_badge')
+
+
+def ormPath(db, rows):
+    from app.models import Employee
+    employees = db.session.execute(db.select(Employee).order_by(Employee.employee_id).limit(rows)).scalars().all()
+    for employee in employees:  # What the template does with each one
+        for name in ATTRIBUTES:
+            getattr(employee, name)
+    db.session.expunge_all()
+    return employees
+
+
+def readModelPath(db, rows):
+    from app.models import Employee
+    from app.readmodel import selectEmployees, employeeRows
+    employees = employeeRows(selectEmployees().order_by(Employee.employee_id).limit(rows))
+    for employee in employees:
+        for name in ATTRIBUTES:
+            getattr(employee, name)
+    return employees
+
+
+def measure(db, path, rows, runs):
+    path(db, rows)  # Warm the statement cache and the connection
+    best = None
+    for i in range(runs):
+        gc.collect()
+        t = time.process_time()
+        path(db, rows)
+        elapsed = time.process_time() - t
+        best = elapsed if best is None else min(best, elapsed)
+    gc.collect()
+    tracemalloc.start()
+    result = path(db, rows)
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del result
+    return dict(us_per_row=round(best / rows * 1e6, 2), peak_kb=round(peak / 1024, 1),
+                retained_kb=round(current / 1024, 1), retained_blocks=blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the ORM and read model paths for display reads.')
+    parser.add_argument('--employees', type=int, default=20000, help='Employees seeded')
+    parser.add_argument('--rows', type=int, nargs='+', default=[200, 20000], help='Rows read per call')
+    parser.add_argument('--runs', type=int, default=5, help='Timed calls per path; the fastest is reported')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'data.sqlite')
+    os.environ['JOBS_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'jobs.sqlite')
+    os.environ['AUDIT_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'audit.sqlite')
+    from app import create_app, db
+    from benchmarks.routes import seed
+    app = create_app()
+    seed(app, db, args.employees)
+    results = []
+    with app.app_context():
+        for rows in args.rows:
+            rows = min(rows, args.employees)
+            orm = measure(db, ormPath, rows, args.runs)
+            read_model = measure(db, readModelPath, rows, args.runs)
+            results.append(dict(rows=rows, orm=orm, read_model=read_model,
+                                cpu_speedup=round(orm['us_per_row'] / read_model['us_per_row'], 1),
+                                memory_reduction=round(orm['peak_kb'] / read_model['peak_kb'], 1)))
+    print(json.dumps(dict(employees=args.employees, runs=results), indent=2))
+
+
+if __name__ == '__main__':
+    main()
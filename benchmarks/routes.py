@@ -0,0 +1,296 @@
+# Route benchmarks against synthetic workforces.
+#
+#   python -m benchmarks.routes --sizes 1000 100000 --output bench.json
+#   python -m benchmarks.routes --compare before.json after.json
+#
+# Each size gets a fresh SQLite database in a temporary directory, so the bundled data.sqlite is never
+# touched. Routes are driven in-process through the Flask test client and then over HTTP by concurrent
+# clients against a local threaded server.
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.cookiejar import CookieJar
+from urllib.parse import urlencode
+from urllib.request import build_opener, HTTPCookieProcessor
+
+ROLES = ['Software Engineer', 'Senior Dev', 'DevOps Engineer', 'Data Scientist', 'QA Engineer', 'Product Manager',
+         'Student', 'Team Lead']
+SKILLS = ['Python', 'Java', 'SQL', 'Machine Learning', 'AWS', 'Docker', 'Kubernetes', 'Linux', 'Agile', 'Go',
+          'JavaScript', 'React', 'Spark', 'Hadoop', 'Data Visualization', 'Terraform', 'C++', 'Scrum']
+EDUCATION = ['BSc Computer Science', 'MSc Data Science', 'BEng Software Engineering', 'PhD Statistics', 'UG']
+PASSWORD = 'benchmark-password'
+USERS = 20
+SEED_BATCH = 5000
+
+
+def syntheticRow(n, rng):
+    # One employee in the 10-column layout bulkAddEmployee accepts
+    joined = date(2010, 1, 1) + timedelta(days=rng.randrange(5000))
+    return [f'Employee {n}', f'employee{n}@bench.example.com', joined.isoformat(), rng.choice(ROLES),
+            ', '.join(rng.sample(ROLES, 2)), ', '.join(rng.sample(SKILLS, rng.randint(2, 6))),
+            f'{rng.randint(0, 300) / 10:.1f}', rng.choice(EDUCATION), str(rng.randint(0, 30)), '']
+
+
+def syntheticCsv(start, count, seed=0):
+    from app.importer import EMPLOYEE_CSV_HEADER
+    rng = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(EMPLOYEE_CSV_HEADER)
+    for n in range(start, start + count):
+        writer.writerow(syntheticRow(n, rng))
+    return out.getvalue().encode()
+
+
+def seed(app, db, employees):
+    # Inserts straight through Core in large batches; the import path itself is measured separately
+    from app.models import Employee, User, badgeFor
+    from app.skills import ingestAllSkills
+    rng = random.Random(1)
+    with app.app_context():
+        db.create_all()
+        batch = []
+        for n in range(1, employees + 1):
+            row = syntheticRow(n, rng)
+            batch.append(dict(name=row[0], email=row[1], date_of_joining=date.fromisoformat(row[2]),
+                              current_role=row[3], past_roles=row[4], skills=row[5], experience=float(row[6]),
+                              educational_background=row[7], skill_points=int(row[8]),
+                              achievement_badge=badgeFor(int(row[8]))))
+            if len(batch) == SEED_BATCH or n == employees:
+                db.session.execute(db.insert(Employee.__table__), batch)
+                db.session.commit()
+                batch = []
+        ingestAllSkills(batch_size=SEED_BATCH)
+        for n in range(1, USERS + 1):
+            user = User(user_id=n, username=f'user{n}', email=f'user{n}@bench.example.com')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(p):
+        return ordered[min(int(p / 100 * len(ordered)), len(ordered) - 1)] * 1000
+
+    return dict(p50_ms=round(pick(50), 2), p95_ms=round(pick(95), 2), p99_ms=round(pick(99), 2),
+                max_ms=round(ordered[-1] * 1000, 2))
+
+
+def queryCount(response_headers):
+    # The instrumentation reports queries per request in Server-Timing: db;dur=..;desc="N queries"
+    for header in response_headers:
+        if header.startswith('db;'):
+            return int(header.split('desc="')[1].split(' ')[0])
+    return None
+
+
+def driveInProcess(app, iterations):
+    client = app.test_client()
+    client.post('/login', data=dict(username='user1', password=PASSWORD))
+    routes = {
+        'home': lambda: client.get('/home'),
+        'leaderboard': lambda: client.get('/leaderboard'),
+        'leaderboard_deep': lambda: client.get('/leaderboard?after=0,0'),
+        'listAllEmployees': lambda: client.get('/listAllEmployees'),
+        'listAllEmployees_filtered': lambda: client.get('/listAllEmployees?role=Senior+Dev&sort=points&order=desc'),
+        'analytics': lambda: client.get('/admin/analytics'),
+        'api_employees': lambda: client.get('/api/v1/employees?limit=200'),
+        'api_employees_fields': lambda: client.get('/api/v1/employees?limit=200&fields=name,skill_points'),
+        'api_employees_ids': lambda: client.get('/api/v1/employees?ids=' + ','.join(map(str, range(1, 400, 4)))),
+    }
+    results = {}
+    for name, call in routes.items():
+        call()  # Warm caches and compiled statements before timing
+        samples, queries = [], []
+        started = time.perf_counter()
+        for i in range(iterations):
+            t = time.perf_counter()
+            response = call()
+            samples.append(time.perf_counter() - t)
+            queries.append(queryCount(response.headers.getlist('Server-Timing')))
+            assert response.status_code == 200, (name, response.status_code)
+        elapsed = time.perf_counter() - started
+        results[name] = dict(requests=iterations, throughput_rps=round(iterations / elapsed, 1),
+                             queries_per_request=max(q for q in queries if q is not None), **percentiles(samples))
+    results['login'] = driveLogins(app, max(iterations // 10, 3))
+    results['login_flood'] = driveLoginFlood(app, iterations)
+    results['bulkAddEmployee'] = driveBulkUpload(app, client)
+    return results
+
+
+def driveLogins(app, iterations):
+    samples = []
+    for i in range(iterations):
+        client = app.test_client()
+        t = time.perf_counter()
+        response = client.post('/login', data=dict(username=f'user{i % USERS + 1}', password=PASSWORD))
+        samples.append(time.perf_counter() - t)
+        assert response.status_code == 302, response.status_code
+    return dict(requests=iterations, throughput_rps=round(iterations / sum(samples), 1), **percentiles(samples))
+
+
+def driveLoginFlood(app, attempts):
+    # Wrong passwords for one user from one address with the rate limits on: once the buckets are empty the
+    # attempts should be rejected with 429 at a fraction of the cost of checking a password
+    app.config['RATELIMIT_ENABLED'] = True
+    client = app.test_client()
+    samples = {200: [], 429: []}
+    try:
+        for i in range(attempts):
+            t = time.perf_counter()
+            response = client.post('/login', data=dict(username='user1', password='wrong'))
+            elapsed = time.perf_counter() - t
+            samples[429 if response.status_code == 429 else 200].append(elapsed)
+    finally:
+        app.config['RATELIMIT_ENABLED'] = False
+    return dict(requests=attempts, checked=len(samples[200]), rejected=len(samples[429]),
+                checked_p50_ms=percentiles(samples[200]).get('p50_ms'),
+                rejected_p50_ms=percentiles(samples[429]).get('p50_ms'))
+
+
+def driveBulkUpload(app, client, rows=1000):
+    # Time to accept the upload, and time until its background import job has finished
+    payload = syntheticCsv(10_000_000, rows, seed=2)
+    t = time.perf_counter()
+    response = client.post('/bulkAddEmployee', data={'employee_file': (io.BytesIO(payload), 'bench.csv')},
+                           content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    accepted = time.perf_counter() - t
+    status_url = response.get_json()['status_url']
+    while True:
+        job = client.get(status_url).get_json()
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    finished = time.perf_counter() - t
+    return dict(rows=rows, status=job['status'], accept_ms=round(accepted * 1000, 2),
+                complete_ms=round(finished * 1000, 2), rows_per_second=round(rows / finished, 1))
+
+
+def driveHttp(app, concurrency, duration):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    paths = ['/home', '/leaderboard', '/listAllEmployees']
+
+    def worker(n):
+        opener = build_opener(HTTPCookieProcessor(CookieJar()))
+        opener.open(base + '/login', urlencode(dict(username=f'user{n % USERS + 1}', password=PASSWORD)).encode())
+        samples, errors = [], 0
+        deadline = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            try:
+                opener.open(base + paths[i % len(paths)]).read()
+                samples.append(time.perf_counter() - t)
+            except Exception:
+                errors += 1
+            i += 1
+        return samples, errors
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(worker, range(concurrency)))
+    finally:
+        server.shutdown()
+    samples = [s for worker_samples, errors in outcomes for s in worker_samples]
+    return dict(concurrency=concurrency, duration_s=duration, requests=len(samples),
+                errors=sum(errors for worker_samples, errors in outcomes),
+                throughput_rps=round(len(samples) / duration, 1), **percentiles(samples))
+
+
+def runSize(employees, iterations, concurrency, duration):
+    # Runs in a child process so every size starts with a fresh app, database and RSS high-water mark
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'data.sqlite')
+    os.environ['JOBS_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'jobs.sqlite')
+    os.environ['AUDIT_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'audit.sqlite')
+    from app import create_app, db
+    app = create_app(dict(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False, UPLOAD_FOLDER=workdir))
+    t = time.perf_counter()
+    seed(app, db, employees)
+    result = dict(employees=employees, seed_seconds=round(time.perf_counter() - t, 2))
+    result['routes'] = driveInProcess(app, iterations)
+    if concurrency:
+        result['http'] = driveHttp(app, concurrency, duration)
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {run['employees']: run for run in json.load(f)['runs']}
+    with open(after_path) as f:
+        after = {run['employees']: run for run in json.load(f)['runs']}
+    for employees in sorted(before.keys() & after.keys()):
+        print(f'{employees} employees')
+        for route, stats in after[employees]['routes'].items():
+            old = before[employees]['routes'].get(route, {})
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_per_request', 'complete_ms'):
+                if key in stats and key in old and old[key]:
+                    change = (stats[key] - old[key]) / old[key] * 100
+                    print(f'  {route:<28} {key:<20} {old[key]:>10} -> {stats[key]:>10} ({change:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Flask routes against synthetic workforces.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help='Employee counts, e.g. 1000 100000 1000000')
+    parser.add_argument('--iterations', type=int, default=200, help='Requests per route in-process')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent HTTP clients, 0 to skip')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of HTTP load per size')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two JSON result files')
+    parser.add_argument('--single-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.single_size:
+        json.dump(runSize(args.single_size, args.iterations, args.concurrency, args.duration), sys.stdout)
+        return
+    runs = []
+    for employees in args.sizes:
+        print(f'Benchmarking {employees} employees...', file=sys.stderr)
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.routes', '--single-size', str(employees),
+                                '--iterations', str(args.iterations), '--concurrency', str(args.concurrency),
+                                '--duration', str(args.duration)], capture_output=True, text=True)
+        if child.returncode != 0:
+            sys.stderr.write(child.stderr)
+            sys.exit(child.returncode)
+        runs.append(json.loads(child.stdout))
+    report = dict(commit=gitCommit(), python=sys.version.split()[0], runs=runs)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Cold start cost of a worker process, measured with python -X importtime.
+#
+#   python -m benchmarks.startup
+#   python -m benchmarks.startup --max-ms 600 --forbid email_validator wtforms
+#
+# Each run is a fresh interpreter that imports the app and calls create_app(), as a server worker does.
+# Exits with status 1 when the import time exceeds --max-ms or a --forbid module was imported at start-up.
+import argparse
+import json
+import subprocess
+import sys
+
+STARTUP = 'from app import create_app; create_app()'
+# Modules deferred to first use; importing one at start-up means a top-level import crept back in
+DEFERRED = ['email_validator', 'wtforms', 'flask_wtf', 'app.forms', 'app.importer', 'app.jobs', 'app.export']
+
+
+def importTimes(code):
+    # {module: (self microseconds, cumulative microseconds)} for one cold interpreter
+    child = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if child.returncode != 0:
+        sys.stderr.write(child.stderr)
+        sys.exit(child.returncode)
+    times = {}
+    for line in child.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(code, runs):
+    # The fastest of several runs, which is the least disturbed by whatever else the machine is doing
+    samples = [importTimes(code) for i in range(runs)]
+    best = min(samples, key=lambda times: sum(self_us for self_us, cumulative_us in times.values()))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker start-up import time.')
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts measured; the fastest is reported')
+    parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list')
+    parser.add_argument('--max-ms', type=float, help='Fail when the total import time exceeds this')
+    parser.add_argument('--forbid', nargs='*', default=DEFERRED, help='Fail when any of these is imported')
+    parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+    args = parser.parse_args()
+
+    times = measure(STARTUP, args.runs)
+    total_ms = sum(self_us for self_us, cumulative_us in times.values()) / 1000
+    slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    loaded = [module for module in args.forbid if module in times]
+    if args.json:
+        print(json.dumps(dict(total_ms=round(total_ms, 1), modules=len(times), forbidden_loaded=loaded,
+                              slowest={module: round(self_us / 1000, 2) for module, (self_us, c) in slowest})))
+    else:
+        print(f'{len(times)} modules imported in {total_ms:.1f} ms (best of {args.runs})')
+        for module, (self_us, cumulative_us) in slowest:
+            print(f'  {module:<50} {self_us / 1000:8.2f} ms self {cumulative_us / 1000:8.2f} ms cumulative')
+        for module in loaded:
+            print(f'  {module} was imported at start-up but should be deferred to first use')
+    if loaded or (args.max_ms is not None and total_ms > args.max_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
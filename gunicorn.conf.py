@@ -0,0 +1,26 @@
+# gunicorn settings, picked up automatically by: gunicorn run:app
+#
+# The app is built once in the master and workers are forked from it, so they start without importing
+# anything and share the master's memory pages copy-on-write.
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+# Bound to localhost, gunicorn is reached through one reverse proxy, whose X-Forwarded-For gives the client
+os.environ.setdefault('TRUSTED_PROXY_HOPS', '1')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('WEB_THREADS', 4))
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from app import preload
+    preload()
+
+
+def post_fork(server, worker):
+    # A forked worker must not reuse connections the master may have opened
+    from app import db
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)